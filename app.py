@@ -3,9 +3,12 @@
 import streamlit as st
 import os
 import sys
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 from dotenv import load_dotenv
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 
 # Load environment variables
 load_dotenv()
@@ -14,21 +17,86 @@ load_dotenv()
 src_path = Path(__file__).parent / "src"
 sys.path.insert(0, str(src_path))
 
-from document_processing.processor import process_uploaded_files
-from retrieval.chroma_client import add_documents_to_chroma, get_collection_info, clear_collection
-from rag.workflow import create_rag_workflow, run_rag_query
+from document_processing.extraction_cache import file_digest
+from document_processing.processor import process_file_bytes
+from rag.memory import save_message, load_messages
+from utils.lazy_import import lazy_import
+from utils.logging_config import configure_logging
+from utils.tracing import configure_langsmith_tracing
+
+# How long the sidebar may show a cached collection count before re-querying ChromaDB
+COLLECTION_INFO_TTL_SECONDS = 30
+# How long the sidebar waits for a prefetched collection count once the page is drawn
+COLLECTION_INFO_TIMEOUT_SECONDS = 2
+
+
+# Uploads arrive as views of their buffers, which Streamlit cannot hash itself
+@st.cache_data(show_spinner=False, hash_funcs={memoryview: lambda view: file_digest("", view)})
+def process_file_cached(file_name: str, file_bytes: memoryview, chunk_size: int, chunk_overlap: int):
+    """Process an uploaded file, reusing the result across reruns for identical contents."""
+    return process_file_bytes(file_name, file_bytes, chunk_size, chunk_overlap)
+
+
+@st.cache_resource
+def get_collection_info_generation() -> List[int]:
+    """Counter bumped whenever this app changes a collection, shared by every session."""
+    return [0]
+
+
+@st.cache_data(ttl=COLLECTION_INFO_TTL_SECONDS, show_spinner=False)
+def get_collection_info_cached(collection_name: str, host: str, port: int, generation: int = 0):
+    """Fetch collection info without hitting ChromaDB on every sidebar rerun.
+
+    ``generation`` is only part of the cache key: a fetch that started before
+    the collection changed is stored under the old generation, which is never
+    looked up again.
+    """
+    get_collection_info = lazy_import("retrieval.chroma_client", "get_collection_info")
+    return get_collection_info(collection_name=collection_name, host=host, port=port)
+
+
+def invalidate_collection_info():
+    """Drop cached collection info, including counts still being fetched in the background."""
+    get_collection_info_generation()[0] += 1
+    get_collection_info_cached.clear()
+
+
+@st.cache_resource
+def get_background_executor() -> ThreadPoolExecutor:
+    """Thread pool shared across reruns for network calls that overlap page rendering."""
+    return ThreadPoolExecutor(max_workers=2)
+
+
+def prefetch_collection_info(config) -> Future:
+    """Start fetching collection info in the background while the page renders."""
+    ctx = get_script_run_ctx()
+    generation = get_collection_info_generation()[0]
+
+    def fetch():
+        # Attach the session context so the Streamlit cache is used from this thread
+        add_script_run_ctx(ctx=ctx)
+        return get_collection_info_cached(
+            collection_name=config["collection_name"],
+            host=config["chroma_host"],
+            port=config["chroma_port"],
+            generation=generation
+        )
+
+    return get_background_executor().submit(fetch)
 
 
 def initialize_session_state():
     """Initialize Streamlit session state variables."""
+    if "thread_id" not in st.session_state:
+        # Resume the conversation named in the URL, or start a new one
+        st.session_state.thread_id = st.query_params.get("thread") or uuid.uuid4().hex
+        st.query_params["thread"] = st.session_state.thread_id
     if "messages" not in st.session_state:
-        st.session_state.messages = []
+        st.session_state.messages = load_messages(st.session_state.thread_id)
     if "rag_workflow" not in st.session_state:
         st.session_state.rag_workflow = None
     if "documents_loaded" not in st.session_state:
         st.session_state.documents_loaded = False
-    if "thread_id" not in st.session_state:
-        st.session_state.thread_id = "streamlit_session"
 
 
 def setup_sidebar():
@@ -89,21 +157,34 @@ def setup_sidebar():
     }
 
 
-def display_collection_info(config):
-    """Display information about the current collection."""
+def display_collection_info(config, container, info_future: Optional[Future] = None):
+    """Display information about the current collection.
+
+    Args:
+        config: Sidebar configuration
+        container: Sidebar container to render into
+        info_future: Prefetched collection info, fetched synchronously when omitted
+    """
     try:
-        info = get_collection_info(
-            collection_name=config["collection_name"],
-            host=config["chroma_host"],
-            port=config["chroma_port"]
-        )
+        if info_future is not None:
+            info = info_future.result(timeout=COLLECTION_INFO_TIMEOUT_SECONDS)
+        else:
+            info = get_collection_info_cached(
+                collection_name=config["collection_name"],
+                host=config["chroma_host"],
+                port=config["chroma_port"],
+                generation=get_collection_info_generation()[0]
+            )
         if info:
-            st.sidebar.success(f"Collection: {info['name']}")
-            st.sidebar.info(f"Documents: {info['count']}")
+            container.success(f"Collection: {info['name']}")
+            container.info(f"Documents: {info['count']}")
         else:
-            st.sidebar.warning("Collection not found or empty")
+            container.warning("Collection not found or empty")
+    except TimeoutError:
+        # The first fetch also imports ChromaDB; the count is cached for the next rerun
+        container.info("Loading collection info...")
     except Exception as e:
-        st.sidebar.error(f"Error connecting to ChromaDB: {str(e)}")
+        container.error(f"Error connecting to ChromaDB: {str(e)}")
 
 
 def handle_file_upload(config):
@@ -127,32 +208,24 @@ def handle_file_upload(config):
 
             with st.spinner("Processing documents..."):
                 try:
-                    # Set the API key in the environment for the current session
-                    os.environ["OPENAI_API_KEY"] = openai_key
-
-                    # Process uploaded files
-                    documents = process_uploaded_files(
+                    # Parse, chunk, embed and store the uploads as overlapping stages
+                    ingest_uploaded_files = lazy_import("retrieval.ingestion", "ingest_uploaded_files")
+                    chunk_count = ingest_uploaded_files(
                         uploaded_files,
+                        collection_name=config["collection_name"],
+                        host=config["chroma_host"],
+                        port=config["chroma_port"],
                         chunk_size=config["chunk_size"],
-                        chunk_overlap=config["chunk_overlap"]
+                        chunk_overlap=config["chunk_overlap"],
+                        process_file=process_file_cached
                     )
 
-                    if documents:
-                        # Add to ChromaDB
-                        success = add_documents_to_chroma(
-                            documents,
-                            collection_name=config["collection_name"],
-                            host=config["chroma_host"],
-                            port=config["chroma_port"]
-                        )
-
-                        if success:
-                            st.success(f"Successfully processed and added {len(documents)} document chunks!")
-                            st.session_state.documents_loaded = True
-                            # Reset workflow to use new documents
-                            st.session_state.rag_workflow = None
-                        else:
-                            st.error("Failed to add documents to ChromaDB")
+                    if chunk_count:
+                        invalidate_collection_info()
+                        st.success(f"Successfully processed and added {chunk_count} document chunks!")
+                        st.session_state.documents_loaded = True
+                        # Reset workflow to use new documents
+                        st.session_state.rag_workflow = None
                     else:
                         st.warning("No documents were processed")
 
@@ -171,24 +244,10 @@ def initialize_rag_workflow(config):
 
         try:
             with st.spinner("Initializing RAG workflow..."):
-                # Set the API key in the environment for the current session
-                os.environ["OPENAI_API_KEY"] = openai_key
-
-                # Set up LangSmith tracing if configured
-                langsmith_tracing = os.getenv("LANGSMITH_TRACING", "false").lower() == "true"
-                langsmith_api_key = os.getenv("LANGSMITH_API_KEY")
-                langsmith_endpoint = os.getenv("LANGSMITH_ENDPOINT")
-                langsmith_project = os.getenv("LANGSMITH_PROJECT")
-
-                if langsmith_tracing and langsmith_api_key:
-                    os.environ["LANGCHAIN_TRACING_V2"] = "true"
-                    os.environ["LANGCHAIN_API_KEY"] = langsmith_api_key
-                    if langsmith_endpoint:
-                        os.environ["LANGCHAIN_ENDPOINT"] = langsmith_endpoint
-                    if langsmith_project:
-                        os.environ["LANGCHAIN_PROJECT"] = langsmith_project
+                if configure_langsmith_tracing():
                     st.info("🔍 LangSmith tracing enabled for this session")
 
+                create_rag_workflow = lazy_import("rag.workflow", "create_rag_workflow")
                 st.session_state.rag_workflow = create_rag_workflow(
                     model_name=config["model_name"],
                     temperature=config["temperature"],
@@ -203,19 +262,30 @@ def initialize_rag_workflow(config):
     return True
 
 
+def render_chat_history():
+    """Render the messages of the current conversation."""
+    for message in st.session_state.messages:
+        with st.chat_message(message["role"]):
+            st.markdown(message["content"])
+
+
+@st.fragment
 def display_chat_interface(config):
-    """Display the chat interface."""
+    """Display the chat interface.
+
+    Runs as a fragment, so submitting a message reruns only the chat panel
+    instead of the sidebar, collection info and upload section as well.
+    """
     st.subheader("Chat with your Documents")
 
     # Display chat messages
-    for message in st.session_state.messages:
-        with st.chat_message(message["role"]):
-            st.markdown(message["content"])
+    render_chat_history()
 
     # Chat input
     if prompt := st.chat_input("Ask a question about your documents..."):
         # Add user message to chat history
         st.session_state.messages.append({"role": "user", "content": prompt})
+        save_message(st.session_state.thread_id, "user", prompt)
         with st.chat_message("user"):
             st.markdown(prompt)
 
@@ -224,37 +294,46 @@ def display_chat_interface(config):
             with st.chat_message("assistant"):
                 with st.spinner("Thinking..."):
                     try:
-                        # Ensure LangSmith environment variables are set for tracing
-                        langsmith_tracing = os.getenv("LANGSMITH_TRACING", "false").lower() == "true"
-                        if langsmith_tracing:
-                            langsmith_api_key = os.getenv("LANGSMITH_API_KEY")
-                            langsmith_endpoint = os.getenv("LANGSMITH_ENDPOINT")
-                            langsmith_project = os.getenv("LANGSMITH_PROJECT")
-
-                            if langsmith_api_key:
-                                os.environ["LANGCHAIN_TRACING_V2"] = "true"
-                                os.environ["LANGCHAIN_API_KEY"] = langsmith_api_key
-                                if langsmith_endpoint:
-                                    os.environ["LANGCHAIN_ENDPOINT"] = langsmith_endpoint
-                                if langsmith_project:
-                                    os.environ["LANGCHAIN_PROJECT"] = langsmith_project
-
-                        response = run_rag_query(
+                        get_cached_response = lazy_import("rag.workflow", "get_cached_response")
+                        response = get_cached_response(
                             st.session_state.rag_workflow,
                             prompt,
                             thread_id=st.session_state.thread_id
                         )
-                        st.markdown(response)
-                        st.session_state.messages.append({"role": "assistant", "content": response})
+                        if response is not None:
+                            st.markdown(response)
+                            st.caption("⚡ Answered from cache")
+                        else:
+                            # Render the answer token by token as it is generated
+                            stream_rag_response = lazy_import("rag.workflow", "stream_rag_response")
+                            response = st.write_stream(stream_rag_response(
+                                st.session_state.rag_workflow,
+                                prompt,
+                                thread_id=st.session_state.thread_id
+                            ))
+                            if response:
+                                cache_response = lazy_import("rag.workflow", "cache_response")
+                                cache_response(
+                                    st.session_state.rag_workflow,
+                                    prompt,
+                                    response,
+                                    thread_id=st.session_state.thread_id
+                                )
+                        if response:
+                            st.session_state.messages.append({"role": "assistant", "content": response})
+                            save_message(st.session_state.thread_id, "assistant", response)
+                        else:
+                            st.warning("No answer was generated. Please try rephrasing your question.")
 
                         # Show tracing info if enabled
-                        if langsmith_tracing and os.getenv("LANGSMITH_API_KEY"):
+                        if configure_langsmith_tracing():
                             st.info("🔍 This interaction has been traced in LangSmith")
 
                     except Exception as e:
                         error_msg = f"Error generating response: {str(e)}"
                         st.error(error_msg)
                         st.session_state.messages.append({"role": "assistant", "content": error_msg})
+                        save_message(st.session_state.thread_id, "assistant", error_msg)
         else:
             st.error("RAG workflow not initialized. Please check your configuration.")
 
@@ -273,19 +352,29 @@ def main():
     # Initialize session state
     initialize_session_state()
 
+    # Write logs to LOG_FILE and export LangSmith settings (no-ops after the first run)
+    configure_logging()
+    configure_langsmith_tracing()
+
     # Setup sidebar and get configuration
     config = setup_sidebar()
 
-    # Display collection info
-    display_collection_info(config)
+    # Fetch collection info while the rest of the page renders; it is drawn
+    # into this placeholder at the end
+    collection_info_container = st.sidebar.container()
+    collection_info_future = prefetch_collection_info(config)
 
     # Clear collection button
     if st.sidebar.button("Clear Collection"):
+        clear_collection = lazy_import("retrieval.chroma_client", "clear_collection")
         if clear_collection(
             collection_name=config["collection_name"],
             host=config["chroma_host"],
             port=config["chroma_port"]
         ):
+            invalidate_collection_info()
+            # The prefetched count predates the clear
+            collection_info_future = None
             st.sidebar.success("Collection cleared!")
             st.session_state.documents_loaded = False
             st.session_state.rag_workflow = None
@@ -303,8 +392,14 @@ def main():
         if initialize_rag_workflow(config):
             display_chat_interface(config)
 
+    # Display collection info
+    display_collection_info(config, collection_info_container, collection_info_future)
+
     # Clear chat button
     if st.button("Clear Chat History"):
+        # Start a new thread; the old one stays stored under its own ID
+        st.session_state.thread_id = uuid.uuid4().hex
+        st.query_params["thread"] = st.session_state.thread_id
         st.session_state.messages = []
         st.rerun()
 
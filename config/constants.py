@@ -11,6 +11,7 @@ MAX_TOKENS_PER_CHUNK = 500
 # PDF Processing
 PDF_EXTRACT_IMAGES = False
 PDF_EXTRACT_TABLES = True
+PDF_TEXT_BACKEND = "pymupdf"  # Options: "pymupdf", "pdfium"
 
 # Jupyter Notebook Processing
 INCLUDE_CODE_CELLS = True
@@ -21,6 +22,11 @@ INCLUDE_OUTPUT_CELLS = False
 EMBEDDING_MODEL = "text-embedding-3-small"
 EMBEDDING_DIMENSIONS = 1536
 BATCH_SIZE_EMBEDDINGS = 100
+EMBEDDING_WORKERS = 4
+
+# Ingestion Pipeline
+UPSERT_BATCH_SIZE = 500
+INGESTION_QUEUE_SIZE = 8
 
 # Vector Store Configuration
 VECTOR_STORE_TYPE = "faiss"  # Options: "faiss", "chroma", "inmemory"
@@ -36,12 +42,17 @@ MAX_TOKENS_RESPONSE = 1000
 SUPPORTED_PDF_EXTENSIONS = [".pdf"]
 SUPPORTED_NOTEBOOK_EXTENSIONS = [".ipynb"]
 MAX_FILE_SIZE_MB = 50
+FILE_READ_WORKERS = 8
+BUFFER_POOL_MAX_BYTES = 64 * 1024 * 1024
 
 # Paths
 RAW_DATA_PATH = "data/raw"
 PROCESSED_DATA_PATH = "data/processed"
 VECTOR_STORE_PATH = "data/processed/vector_store"
 METADATA_PATH = "data/processed/metadata.json"
+AGENT_MEMORY_PATH = "data/processed/agent_memory.sqlite"
+EMBEDDING_CACHE_PATH = "data/processed/embedding_cache"
+EXTRACTION_CACHE_PATH = "data/processed/extraction_cache"
 
 # Retrieval Configuration
 RERANK_RESULTS = True
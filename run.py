@@ -1,20 +1,30 @@
 #!/usr/bin/env python3
 """Run script for the RAG system."""
 
+import asyncio
 import subprocess
 import sys
 import os
 from pathlib import Path
 
-def check_chromadb():
-    """Check if ChromaDB is running."""
+async def check_chromadb_async():
+    """Check if ChromaDB is running without blocking the event loop."""
+    import httpx
     try:
-        import requests
-        response = requests.get("http://localhost:8000/api/v1/heartbeat", timeout=5)
-        return response.status_code == 200
+        async with httpx.AsyncClient(base_url="http://localhost:8000", timeout=5) as client:
+            # Newer ChromaDB servers only serve the v2 API
+            for path in ("/api/v2/heartbeat", "/api/v1/heartbeat"):
+                response = await client.get(path)
+                if response.status_code == 200:
+                    return True
+        return False
     except Exception:
         return False
 
+def check_chromadb():
+    """Check if ChromaDB is running."""
+    return asyncio.run(check_chromadb_async())
+
 def start_streamlit():
     """Start the Streamlit application."""
     print("Starting RAG Document Chat System...")
@@ -3,28 +3,33 @@
 import streamlit as st
 import os
 import sys
+import uuid
 from pathlib import Path
 from typing import List
 
-# Add src to Python path
+# Add src and the project root (for config) to Python path
 src_path = Path(__file__).parent.parent
 sys.path.insert(0, str(src_path))
+sys.path.insert(0, str(src_path.parent))
 
 from document_processing.processor import process_uploaded_files
-from retrieval.chroma_client import add_documents_to_chroma, get_collection_info, clear_collection
-from rag.workflow import create_rag_workflow, run_rag_query
+from rag.memory import save_message, load_messages
+from utils.lazy_import import lazy_import
+from utils.logging_config import configure_logging
 
 
 def initialize_session_state():
     """Initialize Streamlit session state variables."""
+    if "thread_id" not in st.session_state:
+        # Resume the conversation named in the URL, or start a new one
+        st.session_state.thread_id = st.query_params.get("thread") or uuid.uuid4().hex
+        st.query_params["thread"] = st.session_state.thread_id
     if "messages" not in st.session_state:
-        st.session_state.messages = []
+        st.session_state.messages = load_messages(st.session_state.thread_id)
     if "rag_workflow" not in st.session_state:
         st.session_state.rag_workflow = None
     if "documents_loaded" not in st.session_state:
         st.session_state.documents_loaded = False
-    if "thread_id" not in st.session_state:
-        st.session_state.thread_id = "streamlit_session"
 
 
 def setup_sidebar():
@@ -65,6 +70,7 @@ def setup_sidebar():
 def display_collection_info(config):
     """Display information about the current collection."""
     try:
+        get_collection_info = lazy_import("retrieval.chroma_client", "get_collection_info")
         info = get_collection_info(
             collection_name=config["collection_name"],
             host=config["chroma_host"],
@@ -103,12 +109,18 @@ def handle_file_upload(config):
                     
                     if documents:
                         # Add to ChromaDB
+                        progress_bar = st.progress(0.0, text="Adding documents to ChromaDB...")
+                        add_documents_to_chroma = lazy_import("retrieval.chroma_client", "add_documents_to_chroma")
                         success = add_documents_to_chroma(
                             documents,
                             collection_name=config["collection_name"],
                             host=config["chroma_host"],
-                            port=config["chroma_port"]
+                            port=config["chroma_port"],
+                            progress_callback=lambda added, total: progress_bar.progress(
+                                added / total, text=f"Added {added}/{total} chunks"
+                            )
                         )
+                        progress_bar.empty()
                         
                         if success:
                             st.success(f"Successfully processed and added {len(documents)} document chunks!")
@@ -129,6 +141,7 @@ def initialize_rag_workflow(config):
     if st.session_state.rag_workflow is None:
         try:
             with st.spinner("Initializing RAG workflow..."):
+                create_rag_workflow = lazy_import("rag.workflow", "create_rag_workflow")
                 st.session_state.rag_workflow = create_rag_workflow(
                     model_name=config["model_name"],
                     temperature=config["temperature"],
@@ -143,19 +156,30 @@ def initialize_rag_workflow(config):
     return True
 
 
+def render_chat_history():
+    """Render the messages of the current conversation."""
+    for message in st.session_state.messages:
+        with st.chat_message(message["role"]):
+            st.markdown(message["content"])
+
+
+@st.fragment
 def display_chat_interface(config):
-    """Display the chat interface."""
+    """Display the chat interface.
+    
+    Runs as a fragment, so submitting a message reruns only the chat panel
+    instead of the sidebar, collection info and upload section as well.
+    """
     st.subheader("Chat with your Documents")
     
     # Display chat messages
-    for message in st.session_state.messages:
-        with st.chat_message(message["role"]):
-            st.markdown(message["content"])
+    render_chat_history()
     
     # Chat input
     if prompt := st.chat_input("Ask a question about your documents..."):
         # Add user message to chat history
         st.session_state.messages.append({"role": "user", "content": prompt})
+        save_message(st.session_state.thread_id, "user", prompt)
         with st.chat_message("user"):
             st.markdown(prompt)
         
@@ -164,17 +188,41 @@ def display_chat_interface(config):
             with st.chat_message("assistant"):
                 with st.spinner("Thinking..."):
                     try:
-                        response = run_rag_query(
+                        get_cached_response = lazy_import("rag.workflow", "get_cached_response")
+                        response = get_cached_response(
                             st.session_state.rag_workflow,
                             prompt,
                             thread_id=st.session_state.thread_id
                         )
-                        st.markdown(response)
-                        st.session_state.messages.append({"role": "assistant", "content": response})
+                        if response is not None:
+                            st.markdown(response)
+                            st.caption("⚡ Answered from cache")
+                        else:
+                            # Render the answer token by token as it is generated
+                            stream_rag_response = lazy_import("rag.workflow", "stream_rag_response")
+                            response = st.write_stream(stream_rag_response(
+                                st.session_state.rag_workflow,
+                                prompt,
+                                thread_id=st.session_state.thread_id
+                            ))
+                            if response:
+                                cache_response = lazy_import("rag.workflow", "cache_response")
+                                cache_response(
+                                    st.session_state.rag_workflow,
+                                    prompt,
+                                    response,
+                                    thread_id=st.session_state.thread_id
+                                )
+                        if response:
+                            st.session_state.messages.append({"role": "assistant", "content": response})
+                            save_message(st.session_state.thread_id, "assistant", response)
+                        else:
+                            st.warning("No answer was generated. Please try rephrasing your question.")
                     except Exception as e:
                         error_msg = f"Error generating response: {str(e)}"
                         st.error(error_msg)
                         st.session_state.messages.append({"role": "assistant", "content": error_msg})
+                        save_message(st.session_state.thread_id, "assistant", error_msg)
         else:
             st.error("RAG workflow not initialized. Please check your configuration.")
 
@@ -193,6 +241,9 @@ def main():
     # Initialize session state
     initialize_session_state()
     
+    # Write logs to LOG_FILE (no-op after the first run)
+    configure_logging()
+    
     # Setup sidebar and get configuration
     config = setup_sidebar()
     
@@ -201,6 +252,7 @@ def main():
     
     # Clear collection button
     if st.sidebar.button("Clear Collection"):
+        clear_collection = lazy_import("retrieval.chroma_client", "clear_collection")
         if clear_collection(
             collection_name=config["collection_name"],
             host=config["chroma_host"],
@@ -225,6 +277,9 @@ def main():
     
     # Clear chat button
     if st.button("Clear Chat History"):
+        # Start a new thread; the old one stays stored under its own ID
+        st.session_state.thread_id = uuid.uuid4().hex
+        st.query_params["thread"] = st.session_state.thread_id
         st.session_state.messages = []
         st.rerun()
 
@@ -0,0 +1,178 @@
+"""On-disk cache of text extracted from documents, keyed by file content."""
+
+import hashlib
+import os
+from functools import lru_cache, partial
+from typing import Callable, Optional
+import diskcache
+from config.constants import EXTRACTION_CACHE_PATH
+
+try:
+    # Non-cryptographic, but 128 bits is plenty for cache keys and it hashes several GB/s
+    from xxhash import xxh3_128 as _new_hasher
+except ImportError:  # xxhash is optional; BLAKE2b is slower but always available
+    _new_hasher = partial(hashlib.blake2b, digest_size=16)
+
+# Files are hashed in blocks of this size rather than read whole
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# Part of every text key; bump it whenever an extractor's output changes for the same file
+EXTRACTION_CACHE_VERSION = 2
+
+# Environment variable overriding the cache directory, e.g. for tests
+EXTRACTION_CACHE_ENV = "EXTRACTION_CACHE_PATH"
+
+
+@lru_cache(maxsize=4)
+def get_extraction_cache(cache_path: str = EXTRACTION_CACHE_PATH) -> diskcache.Cache:
+    """Open the extraction cache once per process.
+
+    Args:
+        cache_path: Directory holding the cache
+
+    Returns:
+        Disk cache shared by every caller in the process
+    """
+    return diskcache.Cache(cache_path)
+
+
+def file_digest(file_path: str, file_bytes: Optional[bytes] = None) -> str:
+    """Hash the contents of a file.
+
+    Args:
+        file_path: Path to the file
+        file_bytes: Contents of the file, hashed instead of reading ``file_path`` when given
+
+    Returns:
+        Hex digest of the contents
+    """
+    hasher = _new_hasher()
+    if file_bytes is not None:
+        hasher.update(file_bytes)
+    else:
+        with open(file_path, 'rb') as file:
+            while block := file.read(HASH_BLOCK_SIZE):
+                hasher.update(block)
+    return hasher.hexdigest()
+
+
+def _resolve_cache(cache_path: Optional[str]) -> diskcache.Cache:
+    """Open the cache at ``cache_path``, ``$EXTRACTION_CACHE_PATH`` or ``EXTRACTION_CACHE_PATH``."""
+    if cache_path is None:
+        cache_path = os.environ.get(EXTRACTION_CACHE_ENV, EXTRACTION_CACHE_PATH)
+    return get_extraction_cache(cache_path)
+
+
+def _recorded_digest(cache: diskcache.Cache, file_path: str, status: os.stat_result) -> Optional[str]:
+    """Get the digest recorded for a file if its size and modification time are unchanged."""
+    recorded = cache.get(f"stat:{os.path.abspath(file_path)}")
+    if recorded is not None and recorded[:2] == (status.st_mtime_ns, status.st_size):
+        return recorded[2]
+    return None
+
+
+def _record_digest(cache: diskcache.Cache, file_path: str, status: os.stat_result, digest: str) -> None:
+    """Record a file's digest for its current size and modification time."""
+    cache.set(f"stat:{os.path.abspath(file_path)}", (status.st_mtime_ns, status.st_size, digest))
+
+
+def _path_digest(cache: diskcache.Cache, file_path: str) -> str:
+    """Hash a file on disk, reusing its recorded digest while its size and modification time are unchanged.
+
+    A stat call takes microseconds, while hashing a large PDF reads all of it.
+
+    Args:
+        cache: Cache holding the recorded digests
+        file_path: Path to the file
+
+    Returns:
+        Hex digest of the contents
+    """
+    status = os.stat(file_path)
+    digest = _recorded_digest(cache, file_path, status)
+    if digest is None:
+        digest = file_digest(file_path)
+        _record_digest(cache, file_path, status, digest)
+    return digest
+
+
+def is_unchanged(file_path: str, cache_path: Optional[str] = None) -> bool:
+    """Check whether a file's digest is recorded for its current size and modification time.
+
+    Such files need not be read to look up their text; ``cached_extract`` can
+    be called for them without their contents.
+
+    Args:
+        file_path: Path to the file
+        cache_path: Directory holding the cache, as for ``cached_extract``
+
+    Returns:
+        True if the recorded digest is still valid
+    """
+    try:
+        status = os.stat(file_path)
+    except OSError:
+        return False
+    return _recorded_digest(_resolve_cache(cache_path), file_path, status) is not None
+
+
+def record_file_digest(
+    file_path: str,
+    status: os.stat_result,
+    file_bytes: bytes,
+    cache_path: Optional[str] = None
+) -> None:
+    """Record the digest of contents read from a file, so later runs can skip reading it.
+
+    Args:
+        file_path: Path to the file
+        status: Status of the file taken before ``file_bytes`` were read, so a
+            change during the read is detected on the next run
+        file_bytes: Contents read from the file
+        cache_path: Directory holding the cache, as for ``cached_extract``
+    """
+    _record_digest(_resolve_cache(cache_path), file_path, status, file_digest(file_path, file_bytes))
+
+
+def cached_extract(
+    file_path: str,
+    file_bytes: Optional[bytes],
+    extractor: str,
+    extract: Callable[[], str],
+    cache_path: Optional[str] = None
+) -> str:
+    """Extract text from a file, reusing the text extracted earlier from identical contents.
+
+    Re-processing a corpus usually finds most files unchanged, and hashing a file
+    is far cheaper than parsing it. Files read from disk are only rehashed when
+    their size or modification time has changed. Empty results are not cached,
+    since extraction errors also produce an empty string.
+
+    Args:
+        file_path: Path to the file
+        file_bytes: Contents of the file, hashed instead of reading ``file_path`` when given
+        extractor: Name of the extractor and any options that change its output
+        extract: Function performing the extraction on a cache miss
+        cache_path: Directory holding the cache (defaults to ``$EXTRACTION_CACHE_PATH``
+            or ``EXTRACTION_CACHE_PATH``)
+
+    Returns:
+        Extracted text
+    """
+    cache = _resolve_cache(cache_path)
+    try:
+        if file_bytes is None:
+            digest = _path_digest(cache, file_path)
+        else:
+            digest = file_digest(file_path, file_bytes)
+    except OSError:
+        # Unreadable files are left to the extractor to report
+        return extract()
+
+    key = f"v{EXTRACTION_CACHE_VERSION}:{extractor}:{digest}"
+    text = cache.get(key)
+    if text is None:
+        text = extract()
+        if text:
+            cache.set(key, text)
+    return text
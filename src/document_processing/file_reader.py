@@ -0,0 +1,155 @@
+"""Concurrent whole-file reads for batch ingestion."""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import List, Optional, Sequence, Union
+from config.constants import BUFFER_POOL_MAX_BYTES, FILE_READ_WORKERS
+
+
+class BufferPool:
+    """Read buffers that are reused from one file to the next.
+
+    A fresh buffer for every file is new memory that the kernel faults in page
+    by page while copying the file into it. Buffers kept from earlier reads are
+    already mapped, so once the pool is warm a read is a single copy into
+    resident memory. The memory held by free buffers is capped, and ``clear``
+    returns it once a batch of work is done.
+    """
+
+    def __init__(self, max_buffers: int = FILE_READ_WORKERS, max_bytes: int = BUFFER_POOL_MAX_BYTES):
+        """Create an empty pool.
+
+        Args:
+            max_buffers: Number of released buffers kept for reuse
+            max_bytes: Total size of the released buffers kept for reuse
+        """
+        self.max_buffers = max_buffers
+        self.max_bytes = max_bytes
+        self._free: List[bytearray] = []
+        self._free_bytes = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, size: int) -> bytearray:
+        """Take the smallest free buffer of at least ``size`` bytes, allocating one if none is large enough.
+
+        Args:
+            size: Number of bytes needed
+
+        Returns:
+            Buffer owned by the caller until it is released
+        """
+        with self._lock:
+            # Best fit, so small files leave the large buffers to large files
+            best_index = None
+            for index, buffer in enumerate(self._free):
+                if len(buffer) >= size and (best_index is None or len(buffer) < len(self._free[best_index])):
+                    best_index = index
+            if best_index is not None:
+                buffer = self._free.pop(best_index)
+                self._free_bytes -= len(buffer)
+                return buffer
+        return bytearray(size)
+
+    def release(self, buffer: bytearray) -> None:
+        """Return a buffer to the pool once nothing refers to its contents any more.
+
+        Buffers that would take the pool past its limits are dropped instead.
+
+        Args:
+            buffer: Buffer obtained from ``acquire``
+        """
+        with self._lock:
+            if len(self._free) < self.max_buffers and self._free_bytes + len(buffer) <= self.max_bytes:
+                self._free.append(buffer)
+                self._free_bytes += len(buffer)
+
+    def clear(self) -> None:
+        """Drop every free buffer, returning its memory."""
+        with self._lock:
+            self._free.clear()
+            self._free_bytes = 0
+
+
+def _read_into_pool(fd: int, size: int, buffer_pool: BufferPool) -> memoryview:
+    """Read ``size`` bytes from a file descriptor into a pooled buffer."""
+    buffer = buffer_pool.acquire(size)
+    view = memoryview(buffer)
+    filled = 0
+    try:
+        while filled < size and (count := os.readv(fd, [view[filled:size]])):
+            filled += count
+    except OSError:
+        buffer_pool.release(buffer)
+        raise
+    return view[:filled]
+
+
+def read_file(
+    file_path: str,
+    max_bytes: Optional[int] = None,
+    buffer_pool: Optional[BufferPool] = None
+) -> Optional[Union[bytes, memoryview]]:
+    """Read a whole file with a single stat and, normally, a single read call.
+
+    Args:
+        file_path: Path to the file
+        max_bytes: Size above which the file is left unread
+        buffer_pool: Pool to read into; the contents are then a view of a pooled
+            buffer, which the caller returns with ``buffer_pool.release(view.obj)``
+
+    Returns:
+        Contents of the file, or None if it cannot be read or is larger than ``max_bytes``
+    """
+    try:
+        fd = os.open(file_path, os.O_RDONLY)
+    except OSError:
+        return None
+
+    try:
+        size = os.fstat(fd).st_size
+        if max_bytes is not None and size > max_bytes:
+            return None
+        if buffer_pool is not None:
+            return _read_into_pool(fd, size, buffer_pool)
+        data = os.read(fd, size)
+        # Reads can come back short, e.g. for very large files
+        parts = [data]
+        remaining = size - len(data)
+        while remaining > 0 and (data := os.read(fd, remaining)):
+            parts.append(data)
+            remaining -= len(data)
+        return parts[0] if len(parts) == 1 else b"".join(parts)
+    except OSError:
+        return None
+    finally:
+        os.close(fd)
+
+
+def read_files_batch(
+    file_paths: Sequence[str],
+    max_bytes: Optional[int] = None,
+    max_workers: int = FILE_READ_WORKERS,
+    buffer_pool: Optional[BufferPool] = None
+) -> List[Optional[Union[bytes, memoryview]]]:
+    """Read several whole files with their reads in flight at the same time.
+
+    Reads release the GIL, so issuing them from a few threads keeps several
+    requests queued at the storage device instead of one open/read/close round
+    trip at a time.
+
+    Args:
+        file_paths: Paths of the files to read
+        max_bytes: Size above which a file is left unread
+        max_workers: Number of concurrent reads
+        buffer_pool: Pool to read into, as for ``read_file``
+
+    Returns:
+        Contents of each file in the same order, None where a file was not read
+    """
+    if len(file_paths) <= 1:
+        return [read_file(file_path, max_bytes, buffer_pool) for file_path in file_paths]
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(file_paths))) as executor:
+        return list(executor.map(partial(read_file, max_bytes=max_bytes, buffer_pool=buffer_pool), file_paths))
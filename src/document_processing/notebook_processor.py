@@ -1,128 +1,273 @@
 """Jupyter notebook processing functions."""
 
-import json
+import io
+import logging
+import mmap
 import os
-from typing import List, Dict, Any
+import re
+from typing import IO, List, Dict, Any, BinaryIO, Iterator, Optional, Tuple, Union
 from pathlib import Path
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+import ijson
+from config.constants import INCLUDE_CODE_CELLS, INCLUDE_MARKDOWN_CELLS, INCLUDE_OUTPUT_CELLS
+from document_processing.extraction_cache import cached_extract
+from document_processing.parallel import map_files_in_processes
+from document_processing.text_splitting import fast_split
+from document_processing.types import ChunkBatch
 
+try:
+    from orjson import loads as _json_loads
+except ImportError:  # orjson is optional; the stdlib decoder gives the same result, only slower
+    import json
 
-def extract_text_from_notebook(notebook_path: str) -> str:
-    """Extract text content from a Jupyter notebook.
+    def _json_loads(data):
+        # Unlike orjson, the stdlib decoder does not accept views of a read buffer
+        return json.loads(bytes(data) if isinstance(data, memoryview) else data)
+
+# Terminal colour and cursor codes found in captured stdout/stderr, compiled once per process
+_ANSI_ESCAPE_RE = re.compile(r"\x1b\[[0-9;]*[A-Za-z]")
+
+# Notebooks at least this large are parsed incrementally instead of decoded in one go
+STREAMING_PARSE_THRESHOLD_BYTES = 32 * 1024 * 1024
+
+# Notebooks at least this large are decoded from a memory map rather than a copy of the file
+MMAP_THRESHOLD_BYTES = 1024 * 1024
+
+logger = logging.getLogger(__name__)
+
+# A notebook file path, or a notebook already open as a text or binary file object
+NotebookSource = Union[str, os.PathLike, IO]
+
+
+def _join_source(source: Union[str, List[str]]) -> str:
+    """Normalize a notebook source field, which may be a string or a list of lines."""
+    return ''.join(source) if isinstance(source, list) else source
+
+
+def _iter_streamed_cells(file: BinaryIO, skipped_fields: Tuple[str, ...]) -> Iterator[Dict[str, Any]]:
+    """Incrementally decode the cells of a notebook file, leaving out some fields of each cell.
+    
+    The parser still scans past skipped fields, such as base64-encoded images,
+    but never builds Python objects for them.
     
     Args:
-        notebook_path: Path to the notebook file
+        file: Notebook file opened in binary mode
+        skipped_fields: Dotted paths of the fields to leave out, relative to a cell
         
-    Returns:
-        Extracted text content as string
+    Yields:
+        Notebook cell dictionaries without the skipped fields
     """
-    try:
-        with open(notebook_path, 'r', encoding='utf-8') as file:
-            notebook = json.load(file)
+    skipped = tuple(f"cells.item.{field}" for field in skipped_fields)
+    skipped_children = tuple(f"{prefix}." for prefix in skipped)
+    builder = None
+    
+    for prefix, event, value in ijson.parse(file):
+        if prefix in skipped or prefix.startswith(skipped_children):
+            continue
+        if event == 'map_key' and f"{prefix}.{value}" in skipped:
+            continue
         
-        text_content = []
+        if prefix == 'cells.item' and event == 'start_map':
+            builder = ijson.ObjectBuilder()
+        if builder is not None:
+            builder.event(event, value)
+            if prefix == 'cells.item' and event == 'end_map':
+                yield builder.value
+                builder = None
+
+
+def _iter_notebook_cells(
+    notebook_path: NotebookSource,
+    notebook_bytes: Optional[bytes] = None,
+    include_outputs: bool = True
+) -> Iterator[Dict[str, Any]]:
+    """Yield the cells of a notebook, choosing the JSON decoder by file size.
+    
+    Typical notebooks are decoded in one pass with orjson when it is installed,
+    from a memory map of the file once they reach ``MMAP_THRESHOLD_BYTES``.
+    Very large notebooks are decoded incrementally with ijson so only the current
+    cell is held in memory, without its attachments, metadata and rich outputs.
+    Contents that are already in memory or open as a file object are always
+    decoded in one pass.
+    
+    Args:
+        notebook_path: Path to the notebook file, or the notebook as an open file object
+        notebook_bytes: Contents of the file, read from memory instead of ``notebook_path`` when given
+        include_outputs: Whether the text outputs of code cells are needed
         
-        for cell in notebook.get('cells', []):
-            cell_type = cell.get('cell_type', '')
-            source = cell.get('source', [])
+    Yields:
+        Notebook cell dictionaries
+    """
+    if notebook_bytes is not None:
+        yield from _json_loads(notebook_bytes).get('cells', [])
+    elif hasattr(notebook_path, 'read'):
+        yield from _json_loads(notebook_path.read()).get('cells', [])
+    elif (size := os.path.getsize(notebook_path)) >= STREAMING_PARSE_THRESHOLD_BYTES:
+        # Only the text of stream outputs is used, never their rich ``data`` payloads
+        outputs_field = "outputs.item.data" if include_outputs else "outputs"
+        with open(notebook_path, 'rb') as file:
+            yield from _iter_streamed_cells(file, ("attachments", "metadata", outputs_field))
+    elif size >= MMAP_THRESHOLD_BYTES:
+        # Decode straight from the page cache; small files are cheaper to read than to map
+        with (
+            open(notebook_path, 'rb') as file,
+            mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped,
+            memoryview(mapped) as view
+        ):
+            notebook = _json_loads(view)
+        yield from notebook.get('cells', [])
+    else:
+        notebook = _json_loads(Path(notebook_path).read_bytes())
+        yield from notebook.get('cells', [])
+
+
+def iter_notebook_text_blocks(
+    notebook_path: NotebookSource,
+    include_markdown: bool = INCLUDE_MARKDOWN_CELLS,
+    include_code: bool = INCLUDE_CODE_CELLS,
+    include_outputs: bool = INCLUDE_OUTPUT_CELLS,
+    notebook_bytes: Optional[bytes] = None
+) -> Iterator[Tuple[str, str]]:
+    """Stream text blocks from a Jupyter notebook one cell at a time.
+    
+    Args:
+        notebook_path: Path to the notebook file, or the notebook as an open file object
+        include_markdown: Whether to emit markdown cells
+        include_code: Whether to emit code cell sources
+        include_outputs: Whether to emit the text outputs of code cells
+        notebook_bytes: Contents of the file, read from memory instead of ``notebook_path`` when given
+        
+    Yields:
+        (tag, text) pair for each included markdown cell, code cell and code output
+    """
+    for cell in _iter_notebook_cells(notebook_path, notebook_bytes, include_outputs):
+        cell_type = cell.get('cell_type', '')
+        
+        if cell_type == 'markdown':
+            if include_markdown:
+                yield "[MARKDOWN]\n", _join_source(cell.get('source', []))
+            
+        elif cell_type == 'code':
+            if include_code:
+                yield "[CODE]\n", _join_source(cell.get('source', []))
             
-            if cell_type == 'markdown':
-                # Add markdown content
-                if isinstance(source, list):
-                    content = ''.join(source)
-                else:
-                    content = source
-                text_content.append(f"[MARKDOWN]\n{content}\n")
-                
-            elif cell_type == 'code':
-                # Add code content
-                if isinstance(source, list):
-                    content = ''.join(source)
-                else:
-                    content = source
-                text_content.append(f"[CODE]\n{content}\n")
-                
-                # Add output if available
-                outputs = cell.get('outputs', [])
-                for output in outputs:
+            # Outputs are often most of a notebook's bytes, so skip them entirely unless requested
+            if include_outputs:
+                for output in cell.get('outputs', []):
                     if 'text' in output:
-                        output_text = output['text']
-                        if isinstance(output_text, list):
-                            output_text = ''.join(output_text)
-                        text_content.append(f"[OUTPUT]\n{output_text}\n")
+                        yield "[OUTPUT]\n", _ANSI_ESCAPE_RE.sub("", _join_source(output['text']))
+
+
+def extract_text_from_notebook(
+    notebook_path: NotebookSource,
+    include_markdown: bool = INCLUDE_MARKDOWN_CELLS,
+    include_code: bool = INCLUDE_CODE_CELLS,
+    include_outputs: bool = INCLUDE_OUTPUT_CELLS,
+    notebook_bytes: Optional[bytes] = None
+) -> str:
+    """Extract text content from a Jupyter notebook.
+    
+    Args:
+        notebook_path: Path to the notebook file, or the notebook as an open file object
+        include_markdown: Whether to include markdown cells
+        include_code: Whether to include code cell sources
+        include_outputs: Whether to include the text outputs of code cells
+        notebook_bytes: Contents of the file, read from memory instead of ``notebook_path`` when given
         
-        return '\n'.join(text_content)
+    Returns:
+        Extracted text content as string
+    """
+    try:
+        buffer = io.StringIO()
+        blocks = iter_notebook_text_blocks(
+            notebook_path, include_markdown, include_code, include_outputs, notebook_bytes
+        )
+        for tag, text in blocks:
+            buffer.write(tag)
+            buffer.write(text)
+            buffer.write("\n\n")
+        return buffer.getvalue()
         
     except Exception as e:
-        print(f"Error extracting text from notebook {notebook_path}: {e}")
+        logger.error("Error extracting text from notebook %s: %s", notebook_path, e)
         return ""
 
 
-def process_notebook_document(notebook_path: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> List[Dict[str, Any]]:
+def process_notebook_document(
+    notebook_path: str,
+    chunk_size: int = 1000,
+    chunk_overlap: int = 200,
+    notebook_bytes: Optional[bytes] = None,
+    split_pages: bool = False
+) -> ChunkBatch:
     """Process a Jupyter notebook into chunks for RAG.
     
     Args:
-        notebook_path: Path to the notebook file
+        notebook_path: Path to the notebook file, also recorded as the chunks' source
         chunk_size: Size of text chunks
         chunk_overlap: Overlap between chunks
+        notebook_bytes: Contents of the file, read from memory instead of ``notebook_path`` when given
+        split_pages: Ignored; accepted so every document processor takes the same arguments
         
     Returns:
-        List of document chunks with metadata
+        Batch of document chunks with ids and metadata
     """
-    # Extract text from notebook
-    text = extract_text_from_notebook(notebook_path)
+    # Extract text from notebook, reusing the text of unchanged files
+    text = cached_extract(
+        notebook_path,
+        notebook_bytes,
+        f"notebook:{INCLUDE_MARKDOWN_CELLS}:{INCLUDE_CODE_CELLS}:{INCLUDE_OUTPUT_CELLS}",
+        lambda: extract_text_from_notebook(notebook_path, notebook_bytes=notebook_bytes)
+    )
     
     if not text:
-        return []
+        logger.info("Processed %s: 0 chunks", os.path.basename(notebook_path))
+        return ChunkBatch()
     
     # Split text into chunks
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size,
-        chunk_overlap=chunk_overlap,
-        length_function=len,
-        separators=["\n\n", "\n", " ", ""]
-    )
+    chunks = fast_split(text, chunk_size, chunk_overlap)
     
-    chunks = text_splitter.split_text(text)
-    
-    # Create document chunks with metadata
-    documents = []
-    filename = Path(notebook_path).name
-    
-    for i, chunk in enumerate(chunks):
-        doc = {
-            "content": chunk,
-            "metadata": {
-                "source": notebook_path,
-                "filename": filename,
-                "chunk_id": i,
-                "document_type": "notebook",
-                "total_chunks": len(chunks)
-            }
-        }
-        documents.append(doc)
-    
-    return documents
+    logger.info("Processed %s: %d chunks", os.path.basename(notebook_path), len(chunks))
+    return ChunkBatch.from_chunks(notebook_path, chunks, "notebook")
 
 
-def process_multiple_notebooks(notebook_directory: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> List[Dict[str, Any]]:
+def process_multiple_notebooks(
+    notebook_directory: str,
+    chunk_size: int = 1000,
+    chunk_overlap: int = 200,
+    num_workers: Optional[int] = None,
+    batch_size: int = 1
+) -> ChunkBatch:
     """Process multiple notebook files from a directory.
     
+    Notebooks are independent, so each file is parsed and split in its own
+    worker process.
+    
     Args:
         notebook_directory: Directory containing notebook files
         chunk_size: Size of text chunks
         chunk_overlap: Overlap between chunks
+        num_workers: Number of worker processes (defaults to the CPU count)
+        batch_size: Number of notebooks handed to a worker at a time
         
     Returns:
-        List of all document chunks from all notebooks
+        Batch of all document chunks from all notebooks
     """
-    all_documents = []
-    notebook_files = [f for f in os.listdir(notebook_directory) if f.lower().endswith('.ipynb')]
+    all_documents = ChunkBatch()
+    with os.scandir(notebook_directory) as entries:
+        notebook_paths = [
+            entry.path for entry in entries
+            if entry.is_file() and entry.name.lower().endswith('.ipynb')
+        ]
     
-    for notebook_file in notebook_files:
-        notebook_path = os.path.join(notebook_directory, notebook_file)
-        documents = process_notebook_document(notebook_path, chunk_size, chunk_overlap)
+    results = map_files_in_processes(
+        process_notebook_document,
+        notebook_paths,
+        chunk_size,
+        chunk_overlap,
+        num_workers=num_workers,
+        batch_size=batch_size
+    )
+    for documents in results:
         all_documents.extend(documents)
-        print(f"Processed {notebook_file}: {len(documents)} chunks")
     
     return all_documents
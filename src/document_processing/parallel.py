@@ -0,0 +1,126 @@
+"""Process pool helpers shared by the document processors."""
+
+import logging
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from logging.handlers import QueueHandler, QueueListener
+from multiprocessing.context import BaseContext
+from typing import Any, Callable, Iterator, List, Optional, Sequence
+
+
+def _init_worker_logging(log_queue: multiprocessing.Queue, level: int) -> None:
+    """Route a worker process's log records to the parent process through a queue.
+
+    Args:
+        log_queue: Queue drained by a listener in the parent process
+        level: Minimum level of records to forward
+    """
+    root = logging.getLogger()
+    root.handlers[:] = [QueueHandler(log_queue)]
+    root.setLevel(level)
+
+
+def _apply_to_files(function: Callable[..., Any], file_paths: Sequence[str], args: tuple) -> List[Any]:
+    """Call ``function(file_path, *args)`` for each file of a batch inside a worker process."""
+    return [function(file_path, *args) for file_path in file_paths]
+
+
+def iter_files_in_processes(
+    function: Callable[..., Any],
+    file_paths: Sequence[str],
+    *args: Any,
+    num_workers: Optional[int] = None,
+    batch_size: int = 1,
+    mp_context: Optional[BaseContext] = None
+) -> Iterator[Any]:
+    """Call ``function(file_path, *args)`` for each file in worker processes, yielding results as they are ready.
+
+    Files are independent, so parsing and splitting them in separate processes
+    scales with the number of cores. Only two batches per worker are submitted
+    ahead of the consumer, so results that have not been consumed yet stay
+    bounded however many files there are. Workers log through a queue to a
+    single listener in this process rather than writing to shared handlers
+    themselves.
+
+    Args:
+        function: Module-level function taking a file path followed by ``args``
+        file_paths: Paths of the files to process
+        *args: Extra arguments passed to every call
+        num_workers: Number of worker processes (defaults to the CPU count)
+        batch_size: Number of files handed to a worker at a time
+        mp_context: Start method of the workers; defaults to the platform's,
+            or to a fork server if other threads are running, since forking a
+            multi-threaded process can deadlock the children
+
+    Yields:
+        Results in the same order as ``file_paths``
+    """
+    max_workers = min(num_workers or os.cpu_count() or 1, len(file_paths))
+
+    # A single worker gains nothing from a pool, so skip the process start-up cost
+    if max_workers <= 1:
+        for file_path in file_paths:
+            yield function(file_path, *args)
+        return
+
+    if mp_context is None and threading.active_count() > 1:
+        mp_context = multiprocessing.get_context("forkserver")
+
+    log_queue = (mp_context or multiprocessing).Queue()
+    listener = QueueListener(log_queue, *logging.getLogger().handlers, respect_handler_level=True)
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=mp_context,
+        initializer=_init_worker_logging,
+        initargs=(log_queue, logging.getLogger().getEffectiveLevel())
+    ) as executor:
+        in_flight = deque()
+        try:
+            for start in range(0, len(file_paths), batch_size):
+                batch = file_paths[start:start + batch_size]
+                in_flight.append(executor.submit(_apply_to_files, function, batch, args))
+                if start == 0:
+                    # Forked workers all start on the first submit, before the listener thread exists
+                    listener.start()
+                if len(in_flight) >= 2 * max_workers:
+                    yield from in_flight.popleft().result()
+            while in_flight:
+                yield from in_flight.popleft().result()
+        finally:
+            # Let the workers exit and flush their queued records before the listener stops
+            executor.shutdown(cancel_futures=True)
+            listener.stop()
+
+
+def map_files_in_processes(
+    function: Callable[..., Any],
+    file_paths: Sequence[str],
+    *args: Any,
+    num_workers: Optional[int] = None,
+    batch_size: int = 1,
+    mp_context: Optional[BaseContext] = None
+) -> List[Any]:
+    """Call ``function(file_path, *args)`` for each file, spreading files over worker processes.
+
+    Args:
+        function: Module-level function taking a file path followed by ``args``
+        file_paths: Paths of the files to process
+        *args: Extra arguments passed to every call
+        num_workers: Number of worker processes (defaults to the CPU count)
+        batch_size: Number of files handed to a worker at a time
+        mp_context: Start method of the workers (defaults to the platform's)
+
+    Returns:
+        Results in the same order as ``file_paths``
+    """
+    return list(iter_files_in_processes(
+        function,
+        file_paths,
+        *args,
+        num_workers=num_workers,
+        batch_size=batch_size,
+        mp_context=mp_context
+    ))
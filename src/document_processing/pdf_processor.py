@@ -1,99 +1,300 @@
 """PDF document processing functions."""
 
+import io
+import logging
+import multiprocessing
 import os
-from typing import List, Dict, Any
-from pathlib import Path
+from functools import partial
+from typing import List, Optional, Tuple
+import pymupdf
+import pypdfium2
 import PyPDF2
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from config.constants import PDF_TEXT_BACKEND
+from document_processing.extraction_cache import cached_extract
+from document_processing.parallel import map_files_in_processes
+from document_processing.text_splitting import fast_split
+from document_processing.types import ChunkBatch
 
+# Documents with at least this many pages have their pages split over worker processes
+PARALLEL_PAGE_THRESHOLD = 200
 
-def extract_text_from_pdf(pdf_path: str) -> str:
-    """Extract text content from a PDF file.
+logger = logging.getLogger(__name__)
+
+# Content stream operators that can put text on a page: the text-showing
+# operators, and Do, which draws form XObjects that may contain text themselves
+TEXT_OPERATORS = (b"Tj", b"TJ", b"'", b'"', b"Do")
+
+
+def _may_contain_text(content: Optional[bytes]) -> bool:
+    """Check whether a page content stream could produce any text.
+    
+    Graphics-heavy pages can carry megabytes of path and fill operators but no
+    text at all. A substring scan of the raw stream is much cheaper than having
+    the extractor parse every operator.
+    
+    Args:
+        content: Decompressed page content stream
+        
+    Returns:
+        False only if the page certainly has no text
+    """
+    return bool(content) and any(operator in content for operator in TEXT_OPERATORS)
+
+
+def _read_pypdf2_contents(page) -> Optional[bytes]:
+    """Read a PyPDF2 page's decompressed content stream without parsing its operators.
+    
+    Args:
+        page: PyPDF2 page object
+        
+    Returns:
+        Raw content stream, or None if the page has none
+    """
+    contents = page.get("/Contents")
+    if contents is None:
+        return None
+    contents = contents.get_object()
+    # /Contents is either one stream or an array of streams drawn in sequence
+    if isinstance(contents, PyPDF2.generic.ArrayObject):
+        return b"\n".join(stream.get_object().get_data() for stream in contents)
+    return contents.get_data()
+
+
+def _extract_text_with_pypdf2(pdf_path: str, pdf_bytes: Optional[bytes] = None) -> str:
+    """Extract text content from a PDF file with the pure-Python PyPDF2 reader.
     
     Args:
         pdf_path: Path to the PDF file
+        pdf_bytes: Contents of the file, read from memory instead of ``pdf_path`` when given
         
     Returns:
         Extracted text content as string
     """
-    text = ""
+    # Collect pages and join once; repeated += copies the whole text per page
+    parts = []
     try:
-        with open(pdf_path, 'rb') as file:
+        with open(pdf_path, 'rb') if pdf_bytes is None else io.BytesIO(pdf_bytes) as file:
             pdf_reader = PyPDF2.PdfReader(file)
             for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
+                if not _may_contain_text(_read_pypdf2_contents(page)):
+                    parts.append("")
+                    continue
+                parts.append(page.extract_text() or "")
     except Exception as e:
-        print(f"Error extracting text from PDF {pdf_path}: {e}")
+        logger.error("Error extracting text from PDF %s: %s", pdf_path, e)
+        return ""
+    
+    return "\n".join(parts).strip()
+
+
+def _extract_text_with_pdfium(pdf_path: str, pdf_bytes: Optional[bytes] = None) -> str:
+    """Extract text content from a PDF file with PDFium.
+    
+    ``get_text_range`` returns a page's whole text in one call, without the
+    per-character boundary checks of bounded extraction.
+    
+    Args:
+        pdf_path: Path to the PDF file
+        pdf_bytes: Contents of the file, read from memory instead of ``pdf_path`` when given
+        
+    Returns:
+        Extracted text content as string
+    """
+    parts = []
+    # PDFium takes bytes but not views of a buffer
+    pdf = pypdfium2.PdfDocument(pdf_path if pdf_bytes is None else bytes(pdf_bytes))
+    try:
+        for page in pdf:
+            textpage = page.get_textpage()
+            parts.append(textpage.get_text_range())
+            textpage.close()
+            page.close()
+    finally:
+        pdf.close()
+    
+    return "\n".join(parts)
+
+
+def _open_with_pymupdf(pdf_path: str, pdf_bytes: Optional[bytes] = None) -> pymupdf.Document:
+    """Open a PDF with PyMuPDF from its path or from its contents in memory."""
+    if pdf_bytes is None:
+        return pymupdf.open(pdf_path)
+    return pymupdf.open(stream=pdf_bytes, filetype="pdf")
+
+
+def _page_text(page: pymupdf.Page) -> str:
+    """Extract the text of a PyMuPDF page, skipping pages that cannot contain any."""
+    return page.get_text("text") if _may_contain_text(page.read_contents()) else ""
+
+
+def _extract_page_range(page_range: Tuple[int, int], pdf_path: str) -> List[str]:
+    """Extract the text of a range of pages in a worker process.
+    
+    Args:
+        page_range: Start and stop page numbers
+        pdf_path: Path to the PDF file
+        
+    Returns:
+        Text of each page in the range
+    """
+    start, stop = page_range
+    with pymupdf.open(pdf_path) as doc:
+        return [_page_text(doc[page_number]) for page_number in range(start, stop)]
+
+
+def _extract_pages_in_processes(pdf_path: str, page_count: int) -> List[str]:
+    """Extract the text of every page, with each worker process handling a contiguous range.
+    
+    PyMuPDF documents must not be shared between threads, so each worker opens
+    the document from its path itself rather than being sent its contents.
+    Workers are started by a fork server, so it is safe even if the caller has
+    other threads running.
+    
+    Args:
+        pdf_path: Path to the PDF file
+        page_count: Number of pages in the document
+        
+    Returns:
+        Text of each page, in page order
+    """
+    num_workers = os.cpu_count() or 1
+    step = -(-page_count // num_workers)
+    page_ranges = [(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+    
+    results = map_files_in_processes(
+        _extract_page_range,
+        page_ranges,
+        pdf_path,
+        num_workers=num_workers,
+        mp_context=multiprocessing.get_context("forkserver")
+    )
+    return [text for page_texts in results for text in page_texts]
+
+
+def extract_text_from_pdf(
+    pdf_path: str,
+    pdf_bytes: Optional[bytes] = None,
+    backend: str = PDF_TEXT_BACKEND,
+    split_pages: bool = False
+) -> str:
+    """Extract text content from a PDF file.
+    
+    Text is extracted in plain reading order with PyMuPDF, or with PDFium when
+    ``backend`` is "pdfium", which can do better on Unicode-heavy documents.
+    With ``split_pages``, long documents are split into page ranges extracted
+    by separate processes. Files that the backend cannot parse are retried with
+    PyPDF2.
+    
+    Args:
+        pdf_path: Path to the PDF file
+        pdf_bytes: Contents of the file, read from memory instead of ``pdf_path`` when given
+        backend: Extraction library, "pymupdf" or "pdfium"
+        split_pages: Start worker processes for long documents; only for
+            command-line and directory processing, where ``pdf_path`` is a file on disk
+        
+    Returns:
+        Extracted text content as string
+    """
+    try:
+        if backend == "pdfium":
+            text = _extract_text_with_pdfium(pdf_path, pdf_bytes)
+        else:
+            with _open_with_pymupdf(pdf_path, pdf_bytes) as doc:
+                page_count = doc.page_count
+                # Workers already process whole files in parallel, so only split pages in the main process
+                if split_pages and page_count >= PARALLEL_PAGE_THRESHOLD and multiprocessing.parent_process() is None:
+                    page_texts = None
+                else:
+                    page_texts = [_page_text(page) for page in doc]
+            if page_texts is None:
+                page_texts = _extract_pages_in_processes(pdf_path, page_count)
+            text = "\n".join(page_texts)
+    except (pymupdf.FileDataError, pypdfium2.PdfiumError):
+        return _extract_text_with_pypdf2(pdf_path, pdf_bytes)
+    except Exception as e:
+        logger.error("Error extracting text from PDF %s: %s", pdf_path, e)
         return ""
     
     return text.strip()
 
 
-def process_pdf_document(pdf_path: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> List[Dict[str, Any]]:
+def process_pdf_document(
+    pdf_path: str,
+    chunk_size: int = 1000,
+    chunk_overlap: int = 200,
+    pdf_bytes: Optional[bytes] = None,
+    split_pages: bool = False
+) -> ChunkBatch:
     """Process a PDF document into chunks for RAG.
     
     Args:
-        pdf_path: Path to the PDF file
+        pdf_path: Path to the PDF file, also recorded as the chunks' source
         chunk_size: Size of text chunks
         chunk_overlap: Overlap between chunks
+        pdf_bytes: Contents of the file, read from memory instead of ``pdf_path`` when given
+        split_pages: Split long documents' pages over worker processes
         
     Returns:
-        List of document chunks with metadata
+        Batch of document chunks with ids and metadata
     """
-    # Extract text from PDF
-    text = extract_text_from_pdf(pdf_path)
+    # Extract text from PDF, reusing the text of unchanged files
+    text = cached_extract(
+        pdf_path,
+        pdf_bytes,
+        f"pdf:{PDF_TEXT_BACKEND}",
+        lambda: extract_text_from_pdf(pdf_path, pdf_bytes, split_pages=split_pages)
+    )
     
     if not text:
-        return []
+        logger.info("Processed %s: 0 chunks", os.path.basename(pdf_path))
+        return ChunkBatch()
     
     # Split text into chunks
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size,
-        chunk_overlap=chunk_overlap,
-        length_function=len,
-        separators=["\n\n", "\n", " ", ""]
-    )
-    
-    chunks = text_splitter.split_text(text)
+    chunks = fast_split(text, chunk_size, chunk_overlap)
     
-    # Create document chunks with metadata
-    documents = []
-    filename = Path(pdf_path).name
-    
-    for i, chunk in enumerate(chunks):
-        doc = {
-            "content": chunk,
-            "metadata": {
-                "source": pdf_path,
-                "filename": filename,
-                "chunk_id": i,
-                "document_type": "pdf",
-                "total_chunks": len(chunks)
-            }
-        }
-        documents.append(doc)
-    
-    return documents
+    logger.info("Processed %s: %d chunks", os.path.basename(pdf_path), len(chunks))
+    return ChunkBatch.from_chunks(pdf_path, chunks, "pdf")
 
 
-def process_multiple_pdfs(pdf_directory: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> List[Dict[str, Any]]:
+def process_multiple_pdfs(
+    pdf_directory: str,
+    chunk_size: int = 1000,
+    chunk_overlap: int = 200,
+    num_workers: Optional[int] = None,
+    batch_size: int = 1
+) -> ChunkBatch:
     """Process multiple PDF files from a directory.
     
+    PDFs are independent, so each file is parsed and split in its own worker
+    process.
+    
     Args:
         pdf_directory: Directory containing PDF files
         chunk_size: Size of text chunks
         chunk_overlap: Overlap between chunks
+        num_workers: Number of worker processes (defaults to the CPU count)
+        batch_size: Number of PDFs handed to a worker at a time
         
     Returns:
-        List of all document chunks from all PDFs
+        Batch of all document chunks from all PDFs
     """
-    all_documents = []
-    pdf_files = [f for f in os.listdir(pdf_directory) if f.lower().endswith('.pdf')]
+    all_documents = ChunkBatch()
+    with os.scandir(pdf_directory) as entries:
+        pdf_paths = [
+            entry.path for entry in entries
+            if entry.is_file() and entry.name.lower().endswith('.pdf')
+        ]
     
-    for pdf_file in pdf_files:
-        pdf_path = os.path.join(pdf_directory, pdf_file)
-        documents = process_pdf_document(pdf_path, chunk_size, chunk_overlap)
+    results = map_files_in_processes(
+        # Split long PDFs' pages when only one file runs in this process
+        partial(process_pdf_document, pdf_bytes=None, split_pages=True),
+        pdf_paths,
+        chunk_size,
+        chunk_overlap,
+        num_workers=num_workers,
+        batch_size=batch_size
+    )
+    for documents in results:
         all_documents.extend(documents)
-        print(f"Processed {pdf_file}: {len(documents)} chunks")
     
     return all_documents
@@ -1,58 +1,237 @@
 """Main document processing functions."""
 
+import logging
 import os
-from typing import List, Dict, Any, Union
-from document_processing.pdf_processor import process_pdf_document, process_multiple_pdfs
-from document_processing.notebook_processor import process_notebook_document, process_multiple_notebooks
+from functools import partial
+from typing import List, Any, Callable, Dict, Iterator, Optional, Union
+from document_processing.pdf_processor import process_pdf_document
+from document_processing.notebook_processor import process_notebook_document, STREAMING_PARSE_THRESHOLD_BYTES
+from document_processing.extraction_cache import is_unchanged, record_file_digest
+from document_processing.file_reader import BufferPool, read_files_batch
+from document_processing.parallel import iter_files_in_processes
+from document_processing.types import ChunkBatch
 
+# Processing function for each supported file extension; each takes the file path,
+# chunk size, chunk overlap and the file's contents, and a ``split_pages`` keyword
+_HANDLERS: Dict[str, Callable[..., ChunkBatch]] = {
+    '.pdf': process_pdf_document,
+    '.ipynb': process_notebook_document,
+}
 
-def process_single_document(file_path: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> List[Dict[str, Any]]:
+logger = logging.getLogger(__name__)
+
+# Read buffers reused by the batches this process handles, emptied after each process_documents call
+_buffer_pool = BufferPool()
+
+
+def process_single_document(
+    file_path: str,
+    chunk_size: int = 1000,
+    chunk_overlap: int = 200,
+    file_bytes: Optional[bytes] = None,
+    split_pages: bool = False
+) -> ChunkBatch:
     """Process a single document (PDF or notebook).
     
     Args:
         file_path: Path to the document file
         chunk_size: Size of text chunks
         chunk_overlap: Overlap between chunks
+        file_bytes: Contents of the file, parsed from memory instead of ``file_path`` when given
+        split_pages: Split long PDFs' pages over worker processes
         
     Returns:
-        List of document chunks with metadata
+        Batch of document chunks with metadata
     """
     file_extension = os.path.splitext(file_path)[1].lower()
+    handler = _HANDLERS.get(file_extension)
+    
+    if handler is None:
+        logger.warning("Unsupported file type: %s", file_extension)
+        return ChunkBatch()
+    return handler(file_path, chunk_size, chunk_overlap, file_bytes, split_pages=split_pages)
+
+
+def _process_file_batch(file_paths: List[str], chunk_size: int, chunk_overlap: int) -> ChunkBatch:
+    """Read a batch of files concurrently, then process each one from memory.
+    
+    Files are read into pooled buffers, which are reused once the batch is done.
+    Files large enough to be parsed incrementally are left to be read from disk,
+    and so are unchanged files, whose text is looked up without their contents.
+    
+    Args:
+        file_paths: Paths of the files to process
+        chunk_size: Size of text chunks
+        chunk_overlap: Overlap between chunks
+        
+    Returns:
+        Batch of the document chunks of all the files
+    """
+    documents = ChunkBatch()
+    to_read = [
+        file_path for file_path in file_paths
+        if os.path.splitext(file_path)[1].lower() in _HANDLERS and not is_unchanged(file_path)
+    ]
+    # Taken before reading, so a file changed during the read is not recorded as unchanged
+    statuses = []
+    for file_path in to_read:
+        try:
+            statuses.append(os.stat(file_path))
+        except OSError:
+            statuses.append(None)
+    read = read_files_batch(to_read, max_bytes=STREAMING_PARSE_THRESHOLD_BYTES, buffer_pool=_buffer_pool)
+    contents = dict(zip(to_read, read))
+    
+    try:
+        for file_path, status, file_bytes in zip(to_read, statuses, read):
+            if status is not None and file_bytes is not None:
+                record_file_digest(file_path, status, file_bytes)
+        for file_path in file_paths:
+            documents.extend(process_single_document(file_path, chunk_size, chunk_overlap, contents.get(file_path)))
+    finally:
+        for file_bytes in read:
+            if file_bytes is not None:
+                _buffer_pool.release(file_bytes.obj)
+    
+    return documents
+
+
+def process_documents(
+    file_paths: List[str],
+    chunk_size: int = 1000,
+    chunk_overlap: int = 200,
+    num_workers: Optional[int] = None,
+    batch_size: int = 8
+) -> ChunkBatch:
+    """Process a list of documents, spreading the files over worker processes.
+    
+    Args:
+        file_paths: Paths of the files to process; unsupported files yield no chunks
+        chunk_size: Size of text chunks
+        chunk_overlap: Overlap between chunks
+        num_workers: Number of worker processes (defaults to the CPU count)
+        batch_size: Number of files handed to a worker at a time; a worker
+            reads its batch concurrently, and the cost of sending chunks back
+            is shared by several files
+        
+    Returns:
+        Batch of all document chunks, in the order of ``file_paths``
+    """
+    all_documents = ChunkBatch()
+    file_batches = [file_paths[start:start + batch_size] for start in range(0, len(file_paths), batch_size)]
     
-    if file_extension == '.pdf':
-        return process_pdf_document(file_path, chunk_size, chunk_overlap)
-    elif file_extension == '.ipynb':
-        return process_notebook_document(file_path, chunk_size, chunk_overlap)
-    else:
-        print(f"Unsupported file type: {file_extension}")
-        return []
+    try:
+        for documents in iter_files_in_processes(
+            _process_file_batch,
+            file_batches,
+            chunk_size,
+            chunk_overlap,
+            num_workers=num_workers
+        ):
+            all_documents.extend(documents)
+    finally:
+        # Worker processes exit with their pools; batches processed inline used this process's pool
+        _buffer_pool.clear()
+    
+    return all_documents
+
 
+def yield_chunks_from_directory(
+    directory_path: str,
+    chunk_size: int = 1000,
+    chunk_overlap: int = 200,
+    num_workers: Optional[int] = None,
+    batch_size: int = 1
+) -> Iterator[ChunkBatch]:
+    """Process all supported documents from a directory, one file at a time.
+    
+    PDFs and notebooks share one process pool, and each file's chunks are
+    yielded as soon as they are ready, so a consumer can embed and store them
+    while later files are still being parsed.
+    
+    Args:
+        directory_path: Directory containing documents
+        chunk_size: Size of text chunks
+        chunk_overlap: Overlap between chunks
+        num_workers: Number of worker processes (defaults to the CPU count)
+        batch_size: Number of files handed to a worker at a time
+        
+    Yields:
+        Batch of document chunks for each supported file, PDFs first
+    """
+    # PDFs first, then notebooks
+    with os.scandir(directory_path) as entries:
+        file_paths = sorted(
+            (entry.path for entry in entries
+             if entry.is_file() and os.path.splitext(entry.name)[1].lower() in _HANDLERS),
+            key=lambda path: not path.lower().endswith('.pdf')
+        )
+    
+    yield from iter_files_in_processes(
+        # Split long PDFs' pages when only one file runs in this process
+        partial(process_single_document, file_bytes=None, split_pages=True),
+        file_paths,
+        chunk_size,
+        chunk_overlap,
+        num_workers=num_workers,
+        batch_size=batch_size
+    )
 
-def process_documents_from_directory(directory_path: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> List[Dict[str, Any]]:
+
+def process_documents_from_directory(
+    directory_path: str,
+    chunk_size: int = 1000,
+    chunk_overlap: int = 200,
+    num_workers: Optional[int] = None,
+    batch_size: int = 1
+) -> ChunkBatch:
     """Process all supported documents from a directory.
     
     Args:
         directory_path: Directory containing documents
         chunk_size: Size of text chunks
         chunk_overlap: Overlap between chunks
+        num_workers: Number of worker processes (defaults to the CPU count)
+        batch_size: Number of files handed to a worker at a time
         
     Returns:
-        List of all document chunks from all supported files
+        Batch of all document chunks from all supported files
     """
-    all_documents = []
-    
-    # Process PDFs
-    pdf_documents = process_multiple_pdfs(directory_path, chunk_size, chunk_overlap)
-    all_documents.extend(pdf_documents)
+    all_documents = ChunkBatch()
     
-    # Process notebooks
-    notebook_documents = process_multiple_notebooks(directory_path, chunk_size, chunk_overlap)
-    all_documents.extend(notebook_documents)
+    for documents in yield_chunks_from_directory(
+        directory_path,
+        chunk_size,
+        chunk_overlap,
+        num_workers=num_workers,
+        batch_size=batch_size
+    ):
+        all_documents.extend(documents)
     
     return all_documents
 
 
-def process_uploaded_files(uploaded_files: List[Union[str, Any]], chunk_size: int = 1000, chunk_overlap: int = 200) -> List[Dict[str, Any]]:
+def process_file_bytes(
+    file_name: str,
+    file_bytes: Union[bytes, memoryview],
+    chunk_size: int = 1000,
+    chunk_overlap: int = 200
+) -> ChunkBatch:
+    """Process the raw contents of an uploaded document without writing it to disk.
+    
+    Args:
+        file_name: Original name of the uploaded file
+        file_bytes: File contents, or a view of the buffer holding them
+        chunk_size: Size of text chunks
+        chunk_overlap: Overlap between chunks
+        
+    Returns:
+        Batch of document chunks with metadata
+    """
+    return process_single_document(file_name, chunk_size, chunk_overlap, file_bytes)
+
+
+def process_uploaded_files(uploaded_files: List[Union[str, Any]], chunk_size: int = 1000, chunk_overlap: int = 200) -> ChunkBatch:
     """Process uploaded files from Streamlit.
     
     Args:
@@ -61,41 +240,17 @@ def process_uploaded_files(uploaded_files: List[Union[str, Any]], chunk_size: in
         chunk_overlap: Overlap between chunks
         
     Returns:
-        List of document chunks with metadata
+        Batch of document chunks with metadata
     """
-    all_documents = []
+    all_documents = ChunkBatch()
     
     for uploaded_file in uploaded_files:
         if hasattr(uploaded_file, 'name'):
-            # Streamlit uploaded file object
-            file_extension = os.path.splitext(uploaded_file.name)[1].lower()
-            
-            if file_extension == '.pdf':
-                # Save temporarily and process
-                temp_path = f"temp_{uploaded_file.name}"
-                with open(temp_path, "wb") as f:
-                    f.write(uploaded_file.getbuffer())
-                
-                documents = process_pdf_document(temp_path, chunk_size, chunk_overlap)
-                all_documents.extend(documents)
-                
-                # Clean up temp file
-                os.remove(temp_path)
-                
-            elif file_extension == '.ipynb':
-                # Save temporarily and process
-                temp_path = f"temp_{uploaded_file.name}"
-                with open(temp_path, "wb") as f:
-                    f.write(uploaded_file.getbuffer())
-                
-                documents = process_notebook_document(temp_path, chunk_size, chunk_overlap)
-                all_documents.extend(documents)
-                
-                # Clean up temp file
-                os.remove(temp_path)
+            # Streamlit uploaded file object, parsed from a view of its buffer without copying it
+            documents = process_file_bytes(uploaded_file.name, uploaded_file.getbuffer(), chunk_size, chunk_overlap)
         else:
             # File path string
             documents = process_single_document(uploaded_file, chunk_size, chunk_overlap)
-            all_documents.extend(documents)
+        all_documents.extend(documents)
     
     return all_documents
@@ -0,0 +1,72 @@
+"""Text splitting functions shared by the document processors."""
+
+import re
+from typing import List
+
+# Separators in order of preference, and a pattern matching any of them
+_SEPARATORS = ("\n\n", "\n", " ")
+_SPLIT_RE = re.compile(r"\n\n|\n| ")
+
+
+def _find_split_point(text: str, start: int, limit: int) -> int:
+    """Find where a chunk starting at ``start`` should end, at most at ``limit``.
+
+    Paragraph breaks are preferred over line breaks, and line breaks over spaces,
+    as long as they fall in the second half of the window so chunks stay close to
+    the requested size. Without any separator the window is cut at ``limit``.
+
+    Args:
+        text: Full text being split
+        start: Start offset of the current chunk
+        limit: Maximum end offset of the current chunk
+
+    Returns:
+        End offset of the current chunk
+    """
+    midpoint = start + (limit - start) // 2
+
+    for separator in _SEPARATORS:
+        position = text.rfind(separator, midpoint + 1, limit + len(separator))
+        if position != -1:
+            return position
+
+    position = max(text.rfind(separator, start + 1, midpoint + len(separator)) for separator in _SEPARATORS)
+    return position if position != -1 else limit
+
+
+def fast_split(text: str, chunk_size: int, chunk_overlap: int) -> List[str]:
+    """Split text into overlapping chunks of at most ``chunk_size`` characters.
+
+    Split points are located in one forward pass with bounded searches over each
+    window, instead of the recursive per-separator descent of
+    ``RecursiveCharacterTextSplitter``.
+
+    Args:
+        text: Text to split
+        chunk_size: Maximum size of each chunk
+        chunk_overlap: Number of characters shared by consecutive chunks
+
+    Returns:
+        List of non-empty text chunks
+    """
+    chunks = []
+    length = len(text)
+    start = 0
+
+    while start < length:
+        limit = start + chunk_size
+        end = length if limit >= length else _find_split_point(text, start, limit)
+
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= length:
+            break
+
+        # Step back by the overlap, then forward to the next separator so the
+        # following chunk does not begin mid-word
+        next_start = max(end - chunk_overlap, start + 1)
+        match = _SPLIT_RE.search(text, next_start, end)
+        start = match.end() if match else end
+
+    return chunks
@@ -0,0 +1,187 @@
+"""Data types shared by the document processors."""
+
+import hashlib
+import uuid
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Dict, Any, Iterable, Iterator, Union
+
+
+def chunk_id_prefix(source: str, chunks: Iterable[str] = ()) -> str:
+    """Build the prefix of a document's chunk IDs, which is stable across runs.
+
+    Chunk IDs are this prefix followed by ``-<chunk index>``. Re-ingesting the
+    same document yields the same IDs, while a changed document or another file
+    uploaded under the same name gets new ones. Writers delete a source's old
+    chunks before adding its new ones.
+
+    Args:
+        source: Source path or file name of the document
+        chunks: Text chunks of the document
+
+    Returns:
+        128-bit hash of the source and its contents
+    """
+    hasher = hashlib.blake2b(source.encode(), digest_size=16)
+    for chunk in chunks:
+        # Length-prefixed, so different splits of the same text hash differently
+        encoded = chunk.encode()
+        hasher.update(len(encoded).to_bytes(8, "little"))
+        hasher.update(encoded)
+    return hasher.hexdigest()
+
+
+@dataclass(slots=True)
+class Chunk:
+    """A single document chunk, as produced by indexing or iterating a ``ChunkBatch``.
+
+    Slots keep each instance far smaller than the equivalent dictionary. The
+    chunk can still be read like the ``{"content": ..., "metadata": ...}``
+    dictionaries used elsewhere, though attribute access is faster.
+    """
+
+    id: str
+    content: str
+    metadata: Dict[str, Any]
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in _CHUNK_FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key: str) -> bool:
+        return key in _CHUNK_FIELDS
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Read a field by name, like ``dict.get``."""
+        return getattr(self, key) if key in _CHUNK_FIELDS else default
+
+
+_CHUNK_FIELDS = frozenset(("id", "content", "metadata"))
+
+
+@dataclass(slots=True)
+class ChunkBatch:
+    """Document chunks stored as three aligned columns.
+
+    The columns match the arguments of ChromaDB's ``collection.upsert`` so a batch can
+    be written without repacking. Indexing and iteration produce ``Chunk``
+    objects, which can also be read like ``{"content": ..., "metadata": ...}``
+    dictionaries.
+    """
+
+    ids: List[str] = field(default_factory=list)
+    documents: List[str] = field(default_factory=list)
+    metadatas: List[Dict[str, Any]] = field(default_factory=list)
+
+    @classmethod
+    def from_chunks(cls, source: str, chunks: List[str], document_type: str) -> "ChunkBatch":
+        """Build a batch from the text chunks of one document.
+
+        Args:
+            source: Source path or file name of the document
+            chunks: Text chunks in document order
+            document_type: Type recorded in each chunk's metadata ("pdf" or "notebook")
+
+        Returns:
+            Batch with stable IDs and per-chunk metadata
+        """
+        # Everything but the chunk index is shared, so compute it once per document
+        prefix = chunk_id_prefix(source, chunks)
+        common = {
+            "source": source,
+            "filename": Path(source).name,
+            "document_type": document_type,
+            "total_chunks": len(chunks)
+        }
+        return cls(
+            ids=[f"{prefix}-{i}" for i in range(len(chunks))],
+            documents=list(chunks),
+            metadatas=[{**common, "chunk_id": i} for i in range(len(chunks))]
+        )
+
+    @classmethod
+    def from_dicts(cls, chunks: Iterable[Union[Chunk, Dict[str, Any]]]) -> "ChunkBatch":
+        """Build a batch from chunk dictionaries.
+
+        Args:
+            chunks: Chunks with ``content`` and ``metadata`` keys, and optionally ``id``,
+                as dictionaries or ``Chunk`` objects
+
+        Returns:
+            Batch holding the same chunks
+        """
+        batch = cls()
+        batch.extend(chunks)
+        return batch
+
+    def extend(self, chunks: Union["ChunkBatch", Iterable[Union[Chunk, Dict[str, Any]]]]) -> None:
+        """Append chunks from another batch or from chunk dictionaries.
+
+        Args:
+            chunks: Batch or chunk dictionaries to append
+        """
+        if isinstance(chunks, ChunkBatch):
+            self.ids.extend(chunks.ids)
+            self.documents.extend(chunks.documents)
+            self.metadatas.extend(chunks.metadatas)
+            return
+
+        for chunk in chunks:
+            self.ids.append(chunk.get("id") or str(uuid.uuid4()))
+            self.documents.append(chunk["content"])
+            self.metadatas.append(chunk["metadata"])
+
+    def deduplicated(self) -> "ChunkBatch":
+        """Drop chunks whose content repeats an earlier chunk of the same source.
+        
+        Repeated page headers, footers and boilerplate would otherwise be
+        embedded and stored once per occurrence. Chunks are only compared
+        within a source, so every source keeps its own copy and re-ingesting
+        one document never removes content another still contains. The kept
+        chunks' ``chunk_id`` and ``total_chunks`` are renumbered without gaps.
+        
+        Returns:
+            Batch holding the first occurrence of each distinct chunk per source
+        """
+        unique = ChunkBatch()
+        seen = set()
+        kept_per_source = {}
+        
+        for chunk_id, content, metadata in zip(self.ids, self.documents, self.metadatas):
+            source = metadata.get("source")
+            key = (source, hashlib.blake2b(content.encode(), digest_size=16).digest())
+            if key in seen:
+                continue
+            seen.add(key)
+            kept_per_source.setdefault(source, []).append(len(unique))
+            unique.ids.append(chunk_id)
+            unique.documents.append(content)
+            unique.metadatas.append(metadata)
+        
+        # Sources that lost chunks would otherwise leave gaps in their numbering
+        totals = Counter(metadata.get("source") for metadata in self.metadatas)
+        for source, indices in kept_per_source.items():
+            if len(indices) == totals[source]:
+                continue
+            for number, index in enumerate(indices):
+                metadata = unique.metadatas[index]
+                # Copy before changing so the caller's metadata is left untouched;
+                # only the fields a chunk already has are renumbered
+                renumbered = {**metadata, "chunk_id": number, "total_chunks": len(indices)}
+                unique.metadatas[index] = {key: renumbered[key] for key in metadata}
+        
+        return unique
+    
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[Chunk, "ChunkBatch"]:
+        if isinstance(index, slice):
+            return ChunkBatch(self.ids[index], self.documents[index], self.metadatas[index])
+        return Chunk(self.ids[index], self.documents[index], self.metadatas[index])
+
+    def __iter__(self) -> Iterator[Chunk]:
+        for chunk_id, content, metadata in zip(self.ids, self.documents, self.metadatas):
+            yield Chunk(chunk_id, content, metadata)
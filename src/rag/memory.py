@@ -0,0 +1,96 @@
+"""Persistent conversation memory for the RAG chat, stored in SQLite."""
+
+import sqlite3
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Dict
+from config.constants import AGENT_MEMORY_PATH
+
+# Streamlit serves sessions from several threads that share one connection
+_connection_lock = threading.Lock()
+
+
+@lru_cache(maxsize=4)
+def get_memory_connection(db_path: str = AGENT_MEMORY_PATH) -> sqlite3.Connection:
+    """Open the memory database once per process and make sure its table exists.
+
+    Args:
+        db_path: Path to the SQLite database file
+
+    Returns:
+        SQLite connection shared across threads
+    """
+    Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+    connection = sqlite3.connect(db_path, check_same_thread=False)
+    with _connection_lock, connection:
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS agent_memory ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "session_id TEXT NOT NULL, "
+            "invocation_id INTEGER NOT NULL, "
+            "role TEXT NOT NULL, "
+            "content TEXT NOT NULL)"
+        )
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS agent_memory_session ON agent_memory (session_id, invocation_id)"
+        )
+    return connection
+
+
+def save_message(session_id: str, role: str, content: str, db_path: str = AGENT_MEMORY_PATH) -> None:
+    """Append a chat message to a session's stored transcript.
+
+    Args:
+        session_id: Conversation thread ID
+        role: Message role ("user" or "assistant")
+        content: Message text
+        db_path: Path to the SQLite database file
+    """
+    connection = get_memory_connection(db_path)
+    with _connection_lock, connection:
+        connection.execute(
+            "INSERT INTO agent_memory (session_id, invocation_id, role, content) "
+            "SELECT ?, COUNT(*), ?, ? FROM agent_memory WHERE session_id = ?",
+            (session_id, role, content, session_id)
+        )
+
+
+def load_messages(session_id: str, db_path: str = AGENT_MEMORY_PATH) -> List[Dict[str, str]]:
+    """Load a session's stored transcript in the order it was written.
+
+    Args:
+        session_id: Conversation thread ID
+        db_path: Path to the SQLite database file
+
+    Returns:
+        Chat messages with role and content
+    """
+    connection = get_memory_connection(db_path)
+    with _connection_lock:
+        rows = connection.execute(
+            "SELECT role, content FROM agent_memory WHERE session_id = ? ORDER BY invocation_id",
+            (session_id,)
+        ).fetchall()
+    return [{"role": role, "content": content} for role, content in rows]
+
+
+def create_checkpointer(db_path: str = AGENT_MEMORY_PATH):
+    """Create a LangGraph checkpointer that keeps workflow state in the memory database.
+
+    Graph state for a thread survives restarts, so a resumed conversation continues
+    from its checkpoint instead of replaying the transcript through the model.
+    The checkpointer serializes access with its own lock, so it gets its own
+    connection rather than sharing the one guarded by ``_connection_lock``.
+
+    Args:
+        db_path: Path to the SQLite database file
+
+    Returns:
+        SQLite-backed LangGraph checkpointer
+    """
+    # Imported here so loading chat history does not pull in LangGraph
+    from langgraph.checkpoint.sqlite import SqliteSaver
+
+    Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+    return SqliteSaver(sqlite3.connect(db_path, check_same_thread=False))
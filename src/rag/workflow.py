@@ -1,13 +1,31 @@
 """LangGraph agentic RAG workflow implementation."""
 
-from typing import Literal, Dict, Any
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Literal, Dict, Any, Iterator, Optional, Tuple
 from langgraph.graph import MessagesState, StateGraph, START, END
-from langgraph.prebuilt import ToolNode, tools_condition
-from langgraph.checkpoint.memory import MemorySaver
+from langgraph.prebuilt import tools_condition
 from langchain.chat_models import init_chat_model
-from langchain_core.messages import convert_to_messages
+from langchain_core.messages import convert_to_messages, AIMessage, AIMessageChunk, ToolMessage
 from pydantic import BaseModel, Field
-from retrieval.retriever import create_retriever_tool_for_rag
+from retrieval.chroma_client import get_collection_version
+from retrieval.retriever import create_retriever_tool_for_rag, normalize_query
+from rag.memory import create_checkpointer
+
+
+# Maximum number of answers kept by run_rag_query_cached
+RESPONSE_CACHE_SIZE = 256
+
+# Retrieval scores above this are relevant and below the other are not, without asking the grader
+GRADE_ACCEPT_SCORE = 0.8
+GRADE_REJECT_SCORE = 0.3
+
+# Nodes whose model output is the answer shown to the user
+ANSWER_NODES = ("generate_query_or_respond", "generate_answer")
+
+_response_cache: "OrderedDict[Tuple[Any, str, str], str]" = OrderedDict()
+_response_cache_lock = threading.Lock()
 
 
 # Pydantic model for document grading
@@ -18,6 +36,103 @@ class GradeDocuments(BaseModel):
     )
 
 
+def _turn_tool_messages(messages) -> list:
+    """Get the tool results that answered the last round of tool calls.
+    
+    Args:
+        messages: Conversation messages, ending with the tool results
+        
+    Returns:
+        Trailing tool messages in the order they were added
+    """
+    tool_messages = []
+    for message in reversed(messages):
+        if not isinstance(message, ToolMessage):
+            break
+        tool_messages.append(message)
+    return tool_messages[::-1]
+
+
+def _turn_context(messages) -> str:
+    """Join the retrieved documents of every query in the last round of tool calls.
+    
+    Args:
+        messages: Conversation messages, ending with the tool results
+        
+    Returns:
+        Retrieved context for grading and answering
+    """
+    tool_messages = _turn_tool_messages(messages)
+    if not tool_messages:
+        return messages[-1].content
+    return "\n\n".join(message.content for message in tool_messages)
+
+
+def answer_retrieval_calls(search_batch, tool_calls) -> list:
+    """Answer retrieval tool calls with one batched search.
+    
+    A failed search is reported back to the model in each call's tool message,
+    as LangGraph's ``ToolNode`` does, rather than aborting the graph run.
+    
+    Args:
+        search_batch: Function returning the formatted documents and best score for each query
+        tool_calls: Tool calls of the last AI message
+        
+    Returns:
+        One tool message per tool call
+    """
+    try:
+        # The retriever tool takes a single string argument
+        queries = [next(iter(tool_call["args"].values()), "") for tool_call in tool_calls]
+        results = search_batch(queries)
+    except Exception as e:
+        return [
+            ToolMessage(
+                content=f"Error: {e!r}\n Please fix your mistakes.",
+                name=tool_call["name"],
+                tool_call_id=tool_call["id"],
+                status="error"
+            )
+            for tool_call in tool_calls
+        ]
+    
+    return [
+        ToolMessage(
+            content=content,
+            artifact={"top_score": top_score},
+            name=tool_call["name"],
+            tool_call_id=tool_call["id"]
+        )
+        for tool_call, (content, top_score) in zip(tool_calls, results)
+    ]
+
+
+def route_on_scores(messages) -> Optional[str]:
+    """Route on the best retrieval score of the last round of tool calls.
+    
+    When the model expanded the question into several queries, the documents
+    of the best matching query decide, not those of the last one.
+    
+    Args:
+        messages: Conversation messages, ending with the tool results
+        
+    Returns:
+        Next node, or None if the grader model has to decide
+    """
+    artifacts = [getattr(message, "artifact", None) or {} for message in _turn_tool_messages(messages)]
+    scores = [artifact["top_score"] for artifact in artifacts if "top_score" in artifact]
+    if not scores:
+        return None
+    
+    # No score means nothing was retrieved
+    top_score = max((score for score in scores if score is not None), default=None)
+    if top_score is None or top_score < GRADE_REJECT_SCORE:
+        return "rewrite_question"
+    if top_score > GRADE_ACCEPT_SCORE:
+        return "generate_answer"
+    return None
+
+
 # Prompts
 GRADE_PROMPT = (
     "You are a grader assessing relevance of a retrieved document to a user question. \n "
@@ -55,6 +170,11 @@ def create_rag_workflow(
 ):
     """Create the agentic RAG workflow.
     
+    Compiled workflows are shared between callers with the same settings;
+    conversations stay separate through the ``thread_id`` in each run's config.
+    A new workflow is compiled once this process has changed the collection,
+    so its retriever sees the current collection.
+    
     Args:
         model_name: Name of the chat model to use
         temperature: Temperature for the model
@@ -62,12 +182,44 @@ def create_rag_workflow(
         chroma_host: ChromaDB host
         chroma_port: ChromaDB port
         
+    Returns:
+        Compiled LangGraph workflow
+    """
+    return _compile_rag_workflow(
+        model_name,
+        temperature,
+        collection_name,
+        chroma_host,
+        chroma_port,
+        get_collection_version(collection_name, chroma_host, chroma_port)
+    )
+
+
+@lru_cache(maxsize=4)
+def _compile_rag_workflow(
+    model_name: str,
+    temperature: float,
+    collection_name: str,
+    chroma_host: str,
+    chroma_port: int,
+    collection_version: int
+):
+    """Build and compile the agentic RAG workflow for one set of settings.
+    
+    Args:
+        model_name: Name of the chat model to use
+        temperature: Temperature for the model
+        collection_name: ChromaDB collection name
+        chroma_host: ChromaDB host
+        chroma_port: ChromaDB port
+        collection_version: Collection version the workflow is built against
+        
     Returns:
         Compiled LangGraph workflow
     """
     
     # Initialize models
-    response_model = init_chat_model(model_name, temperature=temperature)
+    response_model = init_chat_model(model_name, temperature=temperature, streaming=True)
     grader_model = init_chat_model(model_name, temperature=0)
     
     # Create retriever tool
@@ -90,10 +242,27 @@ def create_rag_workflow(
         )
         return {"messages": [response]}
     
+    def retrieve(state: MessagesState):
+        """Answer all retrieval tool calls of the last message with one batched search.
+        
+        When the model expands a question into several queries, they share one
+        embedding request and one ChromaDB call instead of one of each per query.
+        """
+        tool_calls = state["messages"][-1].tool_calls
+        return {"messages": answer_retrieval_calls(retriever_tool.func.batch, tool_calls)}
+    
     def grade_documents(state: MessagesState) -> Literal["generate_answer", "rewrite_question"]:
-        """Determine whether the retrieved documents are relevant to the question."""
+        """Determine whether the retrieved documents are relevant to the question.
+        
+        Clear-cut retrieval scores decide directly; the grader model is only
+        asked when the best score falls between the two thresholds.
+        """
+        route = route_on_scores(state["messages"])
+        if route is not None:
+            return route
+        
         question = state["messages"][0].content
-        context = state["messages"][-1].content
+        context = _turn_context(state["messages"])
         
         prompt = GRADE_PROMPT.format(question=question, context=context)
         response = (
@@ -119,7 +288,7 @@ def create_rag_workflow(
     def generate_answer(state: MessagesState):
         """Generate an answer."""
         question = state["messages"][0].content
-        context = state["messages"][-1].content
+        context = _turn_context(state["messages"])
         prompt = GENERATE_PROMPT.format(question=question, context=context)
         response = response_model.invoke([{"role": "user", "content": prompt}])
         return {"messages": [response]}
@@ -129,7 +298,7 @@ def create_rag_workflow(
     
     # Define the nodes
     workflow.add_node("generate_query_or_respond", generate_query_or_respond)
-    workflow.add_node("retrieve", ToolNode([retriever_tool]))
+    workflow.add_node("retrieve", retrieve)
     workflow.add_node("rewrite_question", rewrite_question)
     workflow.add_node("generate_answer", generate_answer)
     
@@ -154,8 +323,9 @@ def create_rag_workflow(
     workflow.add_edge("generate_answer", END)
     workflow.add_edge("rewrite_question", "generate_query_or_respond")
     
-    # Add memory for conversation history
-    memory = MemorySaver()
+    # Persist conversation state per thread so resumed sessions continue from
+    # their checkpoint instead of replaying the transcript
+    memory = create_checkpointer()
     
     # Compile the workflow
     graph = workflow.compile(checkpointer=memory)
@@ -163,20 +333,15 @@ def create_rag_workflow(
     return graph
 
 
-def run_rag_query(
-    graph,
-    query: str,
-    thread_id: str = "default_thread"
-) -> str:
-    """Run a single query through the RAG workflow.
+def _query_config(query: str, thread_id: str) -> Dict[str, Any]:
+    """Build the run config for a query, with tracing metadata.
 
     Args:
-        graph: Compiled LangGraph workflow
         query: User query
         thread_id: Thread ID for conversation history
 
     Returns:
-        Response from the RAG system
+        LangGraph run config
     """
     import os
 
@@ -194,10 +359,28 @@ def run_rag_query(
     if os.getenv("LANGCHAIN_TRACING_V2") == "true":
         config["run_name"] = f"RAG_Query_{thread_id}"
 
+    return config
+
+
+def run_rag_query(
+    graph,
+    query: str,
+    thread_id: str = "default_thread"
+) -> str:
+    """Run a single query through the RAG workflow.
+
+    Args:
+        graph: Compiled LangGraph workflow
+        query: User query
+        thread_id: Thread ID for conversation history
+
+    Returns:
+        Response from the RAG system
+    """
     # Run the workflow
     result = graph.invoke(
         {"messages": [{"role": "user", "content": query}]},
-        config=config
+        config=_query_config(query, thread_id)
     )
 
     # Extract the final response
@@ -205,12 +388,88 @@ def run_rag_query(
     return final_message.content
 
 
+def get_cached_response(graph, query: str, thread_id: str = "default_thread") -> Optional[str]:
+    """Look up an earlier answer to the same question in the same thread.
+    
+    Args:
+        graph: Compiled LangGraph workflow
+        query: User query
+        thread_id: Thread ID for conversation history
+        
+    Returns:
+        Cached response, or None if the question has not been answered yet
+    """
+    key = (graph, thread_id, normalize_query(query))
+    
+    with _response_cache_lock:
+        if key in _response_cache:
+            _response_cache.move_to_end(key)
+            return _response_cache[key]
+    return None
+
+
+def cache_response(graph, query: str, response: str, thread_id: str = "default_thread") -> None:
+    """Store an answer for later lookups with ``get_cached_response``.
+    
+    Args:
+        graph: Compiled LangGraph workflow
+        query: User query
+        response: Answer to store; empty answers are not stored
+        thread_id: Thread ID for conversation history
+    """
+    if not response:
+        return
+    
+    key = (graph, thread_id, normalize_query(query))
+    
+    with _response_cache_lock:
+        _response_cache[key] = response
+        if len(_response_cache) > RESPONSE_CACHE_SIZE:
+            _response_cache.popitem(last=False)
+
+
+def run_rag_query_cached(
+    graph,
+    query: str,
+    thread_id: str = "default_thread"
+) -> Tuple[str, bool]:
+    """Run a query through the RAG workflow, reusing earlier answers to the same question.
+    
+    Answers are kept in a process-wide LRU cache keyed on the workflow, the thread
+    and the normalized query, so repeating a question in a conversation skips
+    retrieval and generation entirely. Cache hits are not added to the workflow's
+    conversation memory.
+    
+    Args:
+        graph: Compiled LangGraph workflow
+        query: User query
+        thread_id: Thread ID for conversation history
+        
+    Returns:
+        Tuple of the response and whether it was served from the cache
+    """
+    cached = get_cached_response(graph, query, thread_id=thread_id)
+    if cached is not None:
+        return cached, True
+    
+    response = run_rag_query(graph, query, thread_id=thread_id)
+    cache_response(graph, query, response, thread_id=thread_id)
+    
+    return response, False
+
+
 def stream_rag_response(
     graph,
     query: str,
     thread_id: str = "default_thread"
-):
-    """Stream response from the RAG workflow.
+) -> Iterator[str]:
+    """Stream the answer from the RAG workflow token by token.
+    
+    Uses LangGraph's ``messages`` stream mode, which forwards chat model tokens
+    as they are generated, so the answer can be shown before it is complete.
+    Tokens from the grader and the question rewriter are not part of the answer
+    and are skipped. Models that do not stream produce no tokens, so their
+    answer is taken whole from the final graph state instead.
     
     Args:
         graph: Compiled LangGraph workflow
@@ -218,14 +477,20 @@ def stream_rag_response(
         thread_id: Thread ID for conversation history
         
     Yields:
-        Streaming response chunks
+        Text chunks of the answer
     """
-    config = {"configurable": {"thread_id": thread_id}}
-    
-    for chunk in graph.stream(
+    config = _query_config(query, thread_id)
+    streamed = False
+    for chunk, metadata in graph.stream(
         {"messages": [{"role": "user", "content": query}]},
-        config=config
+        config=config,
+        stream_mode="messages"
     ):
-        for node, update in chunk.items():
-            if "messages" in update and update["messages"]:
-                yield update["messages"][-1]
+        if metadata.get("langgraph_node") in ANSWER_NODES and isinstance(chunk, AIMessageChunk) and chunk.content:
+            streamed = True
+            yield chunk.content
+    
+    if not streamed:
+        messages = graph.get_state(config).values.get("messages", [])
+        if messages and isinstance(messages[-1], AIMessage) and messages[-1].content:
+            yield messages[-1].content
@@ -2,14 +2,31 @@
 
 import chromadb
 from chromadb.config import Settings
-from typing import List, Dict, Any, Optional
-import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import List, Dict, Any, Iterable, Optional, Callable, Set, Tuple, Union
 from langchain_openai import OpenAIEmbeddings
+from config.constants import BATCH_SIZE_EMBEDDINGS, EMBEDDING_WORKERS
+from document_processing.types import ChunkBatch
+from retrieval.embedding_cache import embed_documents_cached
+
+# Bumped whenever a collection's contents change, so cached search results can be keyed on it
+_collection_versions: Dict[Tuple[str, int, str], int] = {}
+
+# Servers that have answered a heartbeat in this process
+_heartbeat_ok: Set[Tuple[str, int]] = set()
+
+# Distance function of new collections; relevance scores are cosine similarities in every space
+COLLECTION_SPACE = "cosine"
 
 
 def get_chroma_client(host: str = "localhost", port: int = 8000) -> chromadb.HttpClient:
     """Get ChromaDB client connection.
     
+    The connection to each server is tested only the first time a client for
+    it is created in this process.
+    
     Args:
         host: ChromaDB host
         port: ChromaDB port
@@ -21,16 +38,68 @@ def get_chroma_client(host: str = "localhost", port: int = 8000) -> chromadb.Htt
         client = chromadb.HttpClient(
             host=host,
             port=port,
-            settings=Settings(allow_reset=True)
+            settings=Settings(allow_reset=True, anonymized_telemetry=False)
         )
         # Test connection
-        client.heartbeat()
+        if (host, port) not in _heartbeat_ok:
+            client.heartbeat()
+            _heartbeat_ok.add((host, port))
         return client
     except Exception as e:
         print(f"Error connecting to ChromaDB: {e}")
         raise
 
 
+def get_collection_version(collection_name: str = "rag_documents", host: str = "localhost", port: int = 8000) -> int:
+    """Get a counter that changes whenever this process modifies a collection.
+    
+    Args:
+        collection_name: Name of the collection
+        host: ChromaDB host
+        port: ChromaDB port
+        
+    Returns:
+        Current version of the collection
+    """
+    return _collection_versions.get((host, port, collection_name), 0)
+
+
+def mark_collection_changed(collection_name: str = "rag_documents", host: str = "localhost", port: int = 8000) -> None:
+    """Record that a collection's contents changed, invalidating cached search results.
+    
+    Args:
+        collection_name: Name of the collection
+        host: ChromaDB host
+        port: ChromaDB port
+    """
+    key = (host, port, collection_name)
+    _collection_versions[key] = _collection_versions.get(key, 0) + 1
+
+
+@lru_cache(maxsize=4)
+def get_cached_chroma_client(host: str = "localhost", port: int = 8000) -> chromadb.HttpClient:
+    """Get a ChromaDB client shared by every call for the same host and port.
+    
+    Args:
+        host: ChromaDB host
+        port: ChromaDB port
+        
+    Returns:
+        ChromaDB client instance, created and checked on first use
+    """
+    return get_chroma_client(host, port)
+
+
+@lru_cache(maxsize=1)
+def get_embedding_model() -> OpenAIEmbeddings:
+    """Get the default embedding model, created once per process.
+    
+    Returns:
+        Shared OpenAI embedding model instance
+    """
+    return OpenAIEmbeddings()
+
+
 def create_or_get_collection(client: chromadb.HttpClient, collection_name: str = "rag_documents"):
     """Create or get a ChromaDB collection.
     
@@ -44,7 +113,7 @@ def create_or_get_collection(client: chromadb.HttpClient, collection_name: str =
     try:
         collection = client.get_or_create_collection(
             name=collection_name,
-            metadata={"description": "RAG document collection"}
+            metadata={"description": "RAG document collection", "hnsw:space": COLLECTION_SPACE}
         )
         return collection
     except Exception as e:
@@ -52,53 +121,127 @@ def create_or_get_collection(client: chromadb.HttpClient, collection_name: str =
         raise
 
 
+@lru_cache(maxsize=16)
+def get_cached_collection(collection_name: str = "rag_documents", host: str = "localhost", port: int = 8000):
+    """Get a collection handle shared by every operation on the same collection.
+    
+    Resolving a collection is an HTTP round-trip, so it is done once per
+    collection rather than on every search or write. ``clear_collection``
+    drops the cached handles.
+    
+    Args:
+        collection_name: Name of the collection
+        host: ChromaDB host
+        port: ChromaDB port
+        
+    Returns:
+        ChromaDB collection instance
+    """
+    return create_or_get_collection(get_cached_chroma_client(host, port), collection_name)
+
+
+def delete_stale_chunks(collection, sources: Iterable[str], keep_ids: Iterable[str]) -> int:
+    """Delete the stored chunks of the given source documents that were not just written.
+    
+    Chunk IDs change with a document's contents, so a re-ingested document's
+    old chunks, including those past the end of a now shorter document, would
+    otherwise stay in the collection next to the new ones. This is only called
+    once every new chunk of the sources has been written, so a failed write
+    leaves the previous version in place.
+    
+    Args:
+        collection: ChromaDB collection instance
+        sources: Source paths or file names of the documents that were written
+        keep_ids: IDs of the chunks just written for those documents
+        
+    Returns:
+        Number of chunks deleted
+    """
+    sources = sorted(set(sources))
+    if not sources:
+        return 0
+    
+    keep_ids = set(keep_ids)
+    stored_ids = collection.get(where={"source": {"$in": sources}}, include=[])["ids"]
+    stale_ids = [chunk_id for chunk_id in stored_ids if chunk_id not in keep_ids]
+    if stale_ids:
+        collection.delete(ids=stale_ids)
+    return len(stale_ids)
+
+
 def add_documents_to_chroma(
-    documents: List[Dict[str, Any]], 
+    documents: Union[ChunkBatch, List[Dict[str, Any]]], 
     collection_name: str = "rag_documents",
     host: str = "localhost", 
     port: int = 8000,
-    embedding_model: Optional[Any] = None
+    embedding_model: Optional[Any] = None,
+    batch_size: int = BATCH_SIZE_EMBEDDINGS,
+    progress_callback: Optional[Callable[[int, int], None]] = None,
+    embed_workers: int = EMBEDDING_WORKERS
 ) -> bool:
     """Add documents to ChromaDB collection.
     
+    Documents are embedded and written in batches, so large uploads stay under
+    the embedding API's and ChromaDB's request size limits. Up to
+    ``embed_workers`` embedding requests are in flight while earlier batches
+    are written, which also bounds how many embeddings are held in memory.
+    
     Args:
-        documents: List of document chunks with content and metadata
+        documents: Batch or list of document chunks with content and metadata
         collection_name: Name of the collection
         host: ChromaDB host
         port: ChromaDB port
         embedding_model: Embedding model instance
+        batch_size: Number of documents per embedding request and ChromaDB write
+        progress_callback: Called with (documents added, total documents) after each batch
+        embed_workers: Number of embedding requests sent concurrently
         
     Returns:
         Success status
     """
     try:
-        client = get_chroma_client(host, port)
-        collection = create_or_get_collection(client, collection_name)
+        collection = get_cached_collection(collection_name, host, port)
         
         # Initialize embedding model if not provided
         if embedding_model is None:
-            embedding_model = OpenAIEmbeddings()
-        
-        # Prepare data for ChromaDB
-        texts = []
-        metadatas = []
-        ids = []
-        
-        for doc in documents:
-            texts.append(doc["content"])
-            metadatas.append(doc["metadata"])
-            ids.append(str(uuid.uuid4()))
-        
-        # Generate embeddings
-        embeddings = embedding_model.embed_documents(texts)
-        
-        # Add to collection
-        collection.add(
-            embeddings=embeddings,
-            documents=texts,
-            metadatas=metadatas,
-            ids=ids
-        )
+            embedding_model = get_embedding_model()
+        
+        # Chunk batches already hold the columns ChromaDB expects
+        if not isinstance(documents, ChunkBatch):
+            documents = ChunkBatch.from_dicts(documents)
+        
+        # Identical chunks would be embedded and stored once per occurrence
+        documents = documents.deduplicated()
+        texts = documents.documents
+        metadatas = documents.metadatas
+        ids = documents.ids
+        
+        total = len(texts)
+        
+        def write_batch(start, embeddings_future):
+            end = start + batch_size
+            collection.upsert(
+                embeddings=embeddings_future.result(),
+                documents=texts[start:end],
+                metadatas=metadatas[start:end],
+                ids=ids[start:end]
+            )
+            if progress_callback is not None:
+                progress_callback(min(end, total), total)
+        
+        # Embed batches concurrently and write them in order as they complete
+        with ThreadPoolExecutor(max_workers=max(embed_workers, 1)) as executor:
+            in_flight = deque()
+            for start in range(0, total, batch_size):
+                future = executor.submit(embed_documents_cached, embedding_model, texts[start:start + batch_size])
+                in_flight.append((start, future))
+                if len(in_flight) >= embed_workers:
+                    write_batch(*in_flight.popleft())
+            while in_flight:
+                write_batch(*in_flight.popleft())
+        
+        # Replace what was stored for these documents rather than adding to it
+        delete_stale_chunks(collection, (metadata["source"] for metadata in metadatas if "source" in metadata), ids)
         
         print(f"Added {len(documents)} documents to ChromaDB collection '{collection_name}'")
         return True
@@ -106,62 +249,167 @@ def add_documents_to_chroma(
     except Exception as e:
         print(f"Error adding documents to ChromaDB: {e}")
         return False
+    
+    finally:
+        # Some batches may have been written even if a later one failed
+        mark_collection_changed(collection_name, host, port)
 
 
-def search_documents(
-    query: str, 
+def distance_to_similarity(distance: float, space: str = "l2") -> float:
+    """Convert a ChromaDB distance to a cosine similarity score.
+    
+    OpenAI embeddings are unit length, so squared L2 distance is ``2 - 2 * cos``
+    and cosine and inner product distances are ``1 - cos``.
+    
+    Args:
+        distance: Distance returned by a ChromaDB query
+        space: Distance function of the collection
+        
+    Returns:
+        Cosine similarity between the query and the document
+    """
+    if space == "l2":
+        return 1 - distance / 2
+    return 1 - distance
+
+
+def query_collection_batch(
+    collection,
+    queries: List[str],
     n_results: int = 5,
-    collection_name: str = "rag_documents",
-    host: str = "localhost", 
-    port: int = 8000,
     embedding_model: Optional[Any] = None
-) -> List[Dict[str, Any]]:
-    """Search for relevant documents in ChromaDB.
+) -> List[List[Dict[str, Any]]]:
+    """Search an already resolved ChromaDB collection for several queries at once.
+    
+    All queries are embedded in one request and searched in one ChromaDB call.
     
     Args:
-        query: Search query
-        n_results: Number of results to return
-        collection_name: Name of the collection
-        host: ChromaDB host
-        port: ChromaDB port
+        collection: ChromaDB collection instance
+        queries: Search queries
+        n_results: Number of results to return per query
         embedding_model: Embedding model instance
         
     Returns:
-        List of relevant documents with metadata and scores
+        List of relevant documents with metadata and scores for each query
     """
+    if not queries:
+        return []
+    
     try:
-        client = get_chroma_client(host, port)
-        collection = create_or_get_collection(client, collection_name)
-        
         # Initialize embedding model if not provided
         if embedding_model is None:
-            embedding_model = OpenAIEmbeddings()
+            embedding_model = get_embedding_model()
         
-        # Generate query embedding
-        query_embedding = embedding_model.embed_query(query)
+        # Generate query embeddings
+        query_embeddings = embedding_model.embed_documents(queries)
         
         # Search in collection
         results = collection.query(
-            query_embeddings=[query_embedding],
+            query_embeddings=query_embeddings,
             n_results=n_results,
             include=["documents", "metadatas", "distances"]
         )
         
-        # Format results
+        # Collections created before cosine became the default still use L2
+        space = (getattr(collection, "metadata", None) or {}).get("hnsw:space", "l2")
+        
+        # Format results, one list per query
         formatted_results = []
-        for i in range(len(results["documents"][0])):
-            result = {
-                "content": results["documents"][0][i],
-                "metadata": results["metadatas"][0][i],
-                "score": 1 - results["distances"][0][i]  # Convert distance to similarity score
-            }
-            formatted_results.append(result)
+        for documents, metadatas, distances in zip(results["documents"], results["metadatas"], results["distances"]):
+            formatted_results.append([
+                {
+                    "content": document,
+                    "metadata": metadata,
+                    "score": distance_to_similarity(distance, space)
+                }
+                for document, metadata, distance in zip(documents, metadatas, distances)
+            ])
         
         return formatted_results
         
+    except Exception as e:
+        print(f"Error searching documents in ChromaDB: {e}")
+        return [[] for _ in queries]
+
+
+def query_collection(
+    collection,
+    query: str,
+    n_results: int = 5,
+    embedding_model: Optional[Any] = None
+) -> List[Dict[str, Any]]:
+    """Search an already resolved ChromaDB collection.
+    
+    Args:
+        collection: ChromaDB collection instance
+        query: Search query
+        n_results: Number of results to return
+        embedding_model: Embedding model instance
+        
+    Returns:
+        List of relevant documents with metadata and scores
+    """
+    return query_collection_batch(collection, [query], n_results, embedding_model)[0]
+
+
+def search_documents(
+    query: str, 
+    n_results: int = 5,
+    collection_name: str = "rag_documents",
+    host: str = "localhost", 
+    port: int = 8000,
+    embedding_model: Optional[Any] = None
+) -> List[Dict[str, Any]]:
+    """Search for relevant documents in ChromaDB.
+    
+    Args:
+        query: Search query
+        n_results: Number of results to return
+        collection_name: Name of the collection
+        host: ChromaDB host
+        port: ChromaDB port
+        embedding_model: Embedding model instance
+        
+    Returns:
+        List of relevant documents with metadata and scores
+    """
+    try:
+        collection = get_cached_collection(collection_name, host, port)
     except Exception as e:
         print(f"Error searching documents in ChromaDB: {e}")
         return []
+    
+    return query_collection(collection, query, n_results, embedding_model)
+
+
+def search_documents_batch(
+    queries: List[str],
+    n_results: int = 5,
+    collection_name: str = "rag_documents",
+    host: str = "localhost",
+    port: int = 8000,
+    embedding_model: Optional[Any] = None
+) -> List[List[Dict[str, Any]]]:
+    """Search for relevant documents for several queries in one ChromaDB call.
+    
+    Args:
+        queries: Search queries
+        n_results: Number of results to return per query
+        collection_name: Name of the collection
+        host: ChromaDB host
+        port: ChromaDB port
+        embedding_model: Embedding model instance
+        
+    Returns:
+        List of relevant documents with metadata and scores for each query
+    """
+    try:
+        collection = get_cached_collection(collection_name, host, port)
+    except Exception as e:
+        print(f"Error searching documents in ChromaDB: {e}")
+        return [[] for _ in queries]
+    
+    return query_collection_batch(collection, queries, n_results, embedding_model)
 
 
 def get_collection_info(
@@ -180,8 +428,7 @@ def get_collection_info(
         Collection information
     """
     try:
-        client = get_chroma_client(host, port)
-        collection = create_or_get_collection(client, collection_name)
+        collection = get_cached_collection(collection_name, host, port)
         
         count = collection.count()
         
@@ -212,8 +459,11 @@ def clear_collection(
         Success status
     """
     try:
-        client = get_chroma_client(host, port)
+        client = get_cached_chroma_client(host, port)
         client.delete_collection(collection_name)
+        # The deleted collection's handle must not be reused
+        get_cached_collection.cache_clear()
+        mark_collection_changed(collection_name, host, port)
         print(f"Cleared collection '{collection_name}'")
         return True
         
@@ -0,0 +1,82 @@
+"""On-disk cache of document embeddings keyed by model and content hash."""
+
+import hashlib
+from functools import lru_cache
+from typing import List, Any
+import diskcache
+import numpy as np
+from config.constants import EMBEDDING_CACHE_PATH
+
+# Precision of cached vectors; half precision halves the cache on disk
+CACHE_DTYPE = np.float16
+
+
+@lru_cache(maxsize=4)
+def get_embedding_cache(cache_path: str = EMBEDDING_CACHE_PATH) -> diskcache.Cache:
+    """Open the embedding cache once per process.
+
+    Args:
+        cache_path: Directory holding the cache
+
+    Returns:
+        Disk cache shared by every caller in the process
+    """
+    return diskcache.Cache(cache_path)
+
+
+def _model_name(embedding_model: Any) -> str:
+    """Identify an embedding model, including its output size when configurable."""
+    name = getattr(embedding_model, "model", None) or type(embedding_model).__name__
+    dimensions = getattr(embedding_model, "dimensions", None)
+    return f"{name}@{dimensions}" if dimensions else name
+
+
+def _cache_key(model_name: str, text: str) -> str:
+    """Build the cache key for a text embedded by a model."""
+    digest = hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+    return f"{model_name}:{np.dtype(CACHE_DTYPE).name}:{digest}"
+
+
+def embed_documents_cached(
+    embedding_model: Any,
+    texts: List[str],
+    cache_path: str = EMBEDDING_CACHE_PATH
+) -> List[List[float]]:
+    """Embed texts, reusing embeddings stored by earlier calls.
+
+    Embeddings are deterministic for a model and text, so re-ingesting a file
+    only sends chunks that have not been embedded before. Vectors are stored in
+    half precision, and fresh embeddings are rounded the same way, so a chunk
+    gets the same vector whether or not it was cached.
+
+    Args:
+        embedding_model: Embedding model instance
+        texts: Texts to embed
+        cache_path: Directory holding the cache
+
+    Returns:
+        One embedding per text, in the same order
+    """
+    cache = get_embedding_cache(cache_path)
+    model_name = _model_name(embedding_model)
+    keys = [_cache_key(model_name, text) for text in texts]
+
+    embeddings = []
+    miss_indices = []
+    for i, key in enumerate(keys):
+        cached = cache.get(key)
+        if cached is None:
+            miss_indices.append(i)
+            embeddings.append(None)
+        else:
+            embeddings.append(np.frombuffer(cached, dtype=CACHE_DTYPE).astype(np.float32).tolist())
+
+    if miss_indices:
+        new_embeddings = embedding_model.embed_documents([texts[i] for i in miss_indices])
+        with cache.transact():
+            for i, embedding in zip(miss_indices, new_embeddings):
+                quantized = np.asarray(embedding, dtype=CACHE_DTYPE)
+                cache.set(keys[i], quantized.tobytes())
+                embeddings[i] = quantized.astype(np.float32).tolist()
+
+    return embeddings
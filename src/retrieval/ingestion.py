@@ -0,0 +1,268 @@
+"""Asynchronous ingestion pipeline: load, transform, embed and upsert."""
+
+import asyncio
+from dataclasses import dataclass, field
+from typing import List, Any, AsyncIterator, Iterable, Iterator, Optional, Callable, Set, Union
+from config.constants import (
+    BATCH_SIZE_EMBEDDINGS,
+    UPSERT_BATCH_SIZE,
+    EMBEDDING_WORKERS,
+    INGESTION_QUEUE_SIZE
+)
+from document_processing.processor import process_file_bytes
+from document_processing.types import ChunkBatch
+from retrieval.chroma_client import (
+    delete_stale_chunks,
+    get_cached_collection,
+    get_embedding_model,
+    mark_collection_changed
+)
+from retrieval.embedding_cache import embed_documents_cached
+
+# Marks the end of a stage's output on a queue
+_DONE = object()
+
+
+@dataclass
+class _Replacement:
+    """New chunks of one incoming batch's documents, and how many are not written yet."""
+
+    sources: Set[str]
+    ids: Set[str] = field(default_factory=set)
+    unwritten: int = 0
+
+
+async def embed_and_upsert(
+    chunk_batches: AsyncIterator[ChunkBatch],
+    collection_name: str = "rag_documents",
+    host: str = "localhost",
+    port: int = 8000,
+    embedding_model: Optional[Any] = None,
+    embed_workers: int = EMBEDDING_WORKERS,
+    embed_batch_size: int = BATCH_SIZE_EMBEDDINGS,
+    upsert_batch_size: int = UPSERT_BATCH_SIZE
+) -> int:
+    """Embed chunk batches and write them to ChromaDB as they arrive.
+
+    Splitting, embedding and upserting run as concurrent stages joined by
+    bounded queues, so embedding one batch overlaps with receiving the next and
+    writing the previous one. Embedding micro-batches are sized independently
+    from the larger upsert batches.
+
+    Args:
+        chunk_batches: Document chunks, typically one batch per file
+        collection_name: Name of the collection
+        host: ChromaDB host
+        port: ChromaDB port
+        embedding_model: Embedding model instance
+        embed_workers: Number of concurrent embedding workers
+        embed_batch_size: Number of chunks per embedding request
+        upsert_batch_size: Number of chunks per ChromaDB write
+
+    Returns:
+        Number of document chunks added to the collection
+
+    Raises:
+        ValueError: If ``embed_workers`` is less than 1
+    """
+    # Without an embedder nothing drains the chunk queue and the pipeline never finishes
+    if embed_workers < 1:
+        raise ValueError(f"embed_workers must be at least 1, got {embed_workers}")
+
+    if embedding_model is None:
+        embedding_model = get_embedding_model()
+
+    collection = await asyncio.to_thread(get_cached_collection, collection_name, host, port)
+
+    chunk_queue = asyncio.Queue(maxsize=INGESTION_QUEUE_SIZE)
+    embedded_queue = asyncio.Queue(maxsize=INGESTION_QUEUE_SIZE)
+
+    async def split():
+        """Hand each incoming batch on in embedding-sized micro-batches."""
+        async for documents in chunk_batches:
+            # Repeated headers and footers would otherwise be embedded once per page
+            documents = documents.deduplicated()
+            replacement = _Replacement(
+                {metadata["source"] for metadata in documents.metadatas if "source" in metadata},
+                set(documents.ids),
+                len(documents)
+            )
+            for start in range(0, len(documents), embed_batch_size):
+                await chunk_queue.put((replacement, documents[start:start + embed_batch_size]))
+        for _ in range(embed_workers):
+            await chunk_queue.put(_DONE)
+
+    async def embed():
+        """Embed one micro-batch of chunks at a time."""
+        while (item := await chunk_queue.get()) is not _DONE:
+            replacement, batch = item
+            embeddings = await asyncio.to_thread(embed_documents_cached, embedding_model, batch.documents)
+            await embedded_queue.put((replacement, batch, embeddings))
+        await embedded_queue.put(_DONE)
+
+    async def upsert() -> int:
+        """Accumulate embedded chunks and write them to ChromaDB in large batches.
+
+        Once every new chunk of a batch's documents is written, their chunks
+        from earlier ingestions are deleted; a failure before then leaves the
+        previous version in place.
+        """
+        pending, embeddings, replacements = ChunkBatch(), [], []
+        total = 0
+
+        async def flush():
+            nonlocal pending, embeddings, replacements, total
+            if not pending:
+                return
+            await asyncio.to_thread(
+                collection.upsert,
+                embeddings=embeddings,
+                documents=pending.documents,
+                metadatas=pending.metadatas,
+                ids=pending.ids
+            )
+            total += len(pending)
+            for replacement, count in replacements:
+                replacement.unwritten -= count
+                if replacement.unwritten == 0:
+                    await asyncio.to_thread(delete_stale_chunks, collection, replacement.sources, replacement.ids)
+            mark_collection_changed(collection_name, host, port)
+            pending, embeddings, replacements = ChunkBatch(), [], []
+
+        active_embedders = embed_workers
+        while active_embedders:
+            item = await embedded_queue.get()
+            if item is _DONE:
+                active_embedders -= 1
+                continue
+
+            replacement, batch, batch_embeddings = item
+            pending.extend(batch)
+            embeddings.extend(batch_embeddings)
+            replacements.append((replacement, len(batch)))
+
+            if len(pending) >= upsert_batch_size:
+                await flush()
+
+        await flush()
+        return total
+
+    *_, total = await asyncio.gather(
+        split(),
+        *(embed() for _ in range(embed_workers)),
+        upsert()
+    )
+
+    print(f"Added {total} documents to ChromaDB collection '{collection_name}'")
+    return total
+
+
+async def run_ingestion_pipeline(
+    uploaded_files: List[Any],
+    collection_name: str = "rag_documents",
+    host: str = "localhost",
+    port: int = 8000,
+    chunk_size: int = 1000,
+    chunk_overlap: int = 200,
+    embedding_model: Optional[Any] = None,
+    process_file: Callable[[str, Union[bytes, memoryview], int, int], ChunkBatch] = process_file_bytes,
+    embed_workers: int = EMBEDDING_WORKERS,
+    embed_batch_size: int = BATCH_SIZE_EMBEDDINGS,
+    upsert_batch_size: int = UPSERT_BATCH_SIZE
+) -> int:
+    """Ingest uploaded files into ChromaDB with overlapping pipeline stages.
+
+    Files are loaded and chunked ahead of ``embed_and_upsert``, so parsing the
+    next file overlaps with embedding and writing the previous ones.
+
+    Args:
+        uploaded_files: Uploaded file objects exposing ``name`` and ``getbuffer()``
+        collection_name: Name of the collection
+        host: ChromaDB host
+        port: ChromaDB port
+        chunk_size: Size of text chunks
+        chunk_overlap: Overlap between chunks
+        embedding_model: Embedding model instance
+        process_file: Function turning a file name and a view of its bytes into document chunks
+        embed_workers: Number of concurrent embedding workers
+        embed_batch_size: Number of chunks per embedding request
+        upsert_batch_size: Number of chunks per ChromaDB write
+
+    Returns:
+        Number of document chunks added to the collection
+    """
+    raw_queue = asyncio.Queue(maxsize=INGESTION_QUEUE_SIZE)
+
+    async def load():
+        """Take a view of the raw bytes of each uploaded file, without copying them."""
+        for uploaded_file in uploaded_files:
+            await raw_queue.put((uploaded_file.name, uploaded_file.getbuffer()))
+        await raw_queue.put(_DONE)
+
+    async def transform():
+        """Split each file into chunks."""
+        while (item := await raw_queue.get()) is not _DONE:
+            file_name, file_bytes = item
+            yield await asyncio.to_thread(process_file, file_name, file_bytes, chunk_size, chunk_overlap)
+
+    _, total = await asyncio.gather(
+        load(),
+        embed_and_upsert(
+            transform(),
+            collection_name,
+            host,
+            port,
+            embedding_model,
+            embed_workers,
+            embed_batch_size,
+            upsert_batch_size
+        )
+    )
+    return total
+
+
+async def _iterate_in_thread(first: Any, iterator: Iterator[ChunkBatch]) -> AsyncIterator[ChunkBatch]:
+    """Pull batches from a blocking iterator without blocking the event loop.
+
+    Args:
+        first: Batch already taken from the iterator, or ``_DONE`` if it was empty
+        iterator: Remaining batches
+    """
+    batch = first
+    while batch is not _DONE:
+        yield batch
+        batch = await asyncio.to_thread(next, iterator, _DONE)
+
+
+def ingest_uploaded_files(uploaded_files: List[Any], **kwargs) -> int:
+    """Run the ingestion pipeline to completion from synchronous code.
+
+    Args:
+        uploaded_files: Uploaded file objects exposing ``name`` and ``getbuffer()``
+        **kwargs: Options forwarded to ``run_ingestion_pipeline``
+
+    Returns:
+        Number of document chunks added to the collection
+    """
+    return asyncio.run(run_ingestion_pipeline(uploaded_files, **kwargs))
+
+
+def ingest_stream(batches: Iterable[ChunkBatch], **kwargs) -> int:
+    """Embed and store chunk batches as a producer yields them.
+
+    Only the batches waiting in the pipeline's bounded queues are held in
+    memory, so a whole directory can be ingested without materializing every
+    chunk first, e.g. ``ingest_stream(yield_chunks_from_directory(path))``.
+
+    Args:
+        batches: Document chunks, typically one batch per file
+        **kwargs: Options forwarded to ``embed_and_upsert``
+
+    Returns:
+        Number of document chunks added to the collection
+    """
+    # Take the first batch in this thread, so a producer that starts worker
+    # processes forks them before the event loop starts its thread pool
+    iterator = iter(batches)
+    first = next(iterator, _DONE)
+    return asyncio.run(embed_and_upsert(_iterate_in_thread(first, iterator), **kwargs))
@@ -1,10 +1,56 @@
 """Retriever functions for RAG system."""
 
-from typing import List, Dict, Any, Optional
-from langchain.tools.retriever import create_retriever_tool
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple
 from langchain_core.tools import Tool
-from retrieval.chroma_client import search_documents
-from langchain_openai import OpenAIEmbeddings
+from retrieval.chroma_client import (
+    search_documents,
+    query_collection_batch,
+    get_cached_collection,
+    get_embedding_model,
+    get_collection_version
+)
+
+# Maximum number of formatted results kept by each retriever function
+RETRIEVAL_CACHE_SIZE = 256
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a query for cache lookups by lowercasing and collapsing whitespace.
+    
+    Args:
+        query: User query
+        
+    Returns:
+        Normalized query
+    """
+    return " ".join(query.lower().split())
+
+
+def format_retrieved_documents(results: List[Dict[str, Any]]) -> str:
+    """Format search results as the context string handed to the model.
+    
+    Args:
+        results: Relevant documents with metadata and scores
+        
+    Returns:
+        Formatted string of relevant documents
+    """
+    if not results:
+        return "No relevant documents found."
+    
+    # Format results for RAG, with a rule between consecutive documents
+    formatted_docs = [
+        f"Document {i}:\n"
+        f"Source: {result['metadata'].get('filename', 'Unknown')}\n"
+        f"Type: {result['metadata'].get('document_type', 'Unknown')}\n"
+        f"Content: {result['content']}\n"
+        f"Relevance Score: {result['score']:.3f}\n"
+        for i, result in enumerate(results, 1)
+    ]
+    
+    return "\n" + ("=" * 50 + "\n").join(formatted_docs)
 
 
 def create_chroma_retriever_function(
@@ -16,6 +62,13 @@ def create_chroma_retriever_function(
 ):
     """Create a retriever function for ChromaDB.
     
+    The collection and embedding model are resolved once here, so each query
+    only pays for the embedding and the search itself. Results are cached on
+    the normalized query until this process next modifies the collection; the
+    returned function's ``clear_cache()`` drops them explicitly. Its ``batch()``
+    attribute answers several queries with a single ChromaDB call and also
+    returns each query's best relevance score.
+    
     Args:
         collection_name: Name of the ChromaDB collection
         host: ChromaDB host
@@ -26,6 +79,49 @@ def create_chroma_retriever_function(
     Returns:
         Retriever function
     """
+    collection = get_cached_collection(collection_name, host, port)
+    if embedding_model is None:
+        embedding_model = get_embedding_model()
+    
+    cache: "OrderedDict[Tuple[str, int], Tuple[str, Optional[float]]]" = OrderedDict()
+    cache_lock = threading.Lock()
+    
+    def retrieve_documents_batch(queries: List[str]) -> List[Tuple[str, Optional[float]]]:
+        """Retrieve relevant documents for several queries with one search.
+        
+        Args:
+            queries: Search queries
+            
+        Returns:
+            Formatted string of relevant documents and the best relevance score
+            (None when nothing was found) for each query
+        """
+        version = get_collection_version(collection_name, host, port)
+        keys = [(normalize_query(query), version) for query in queries]
+        
+        found = {}
+        with cache_lock:
+            for key in keys:
+                if key in cache:
+                    cache.move_to_end(key)
+                    found[key] = cache[key]
+        
+        # Search every distinct uncached query in a single request
+        misses = list(dict.fromkeys(key for key in keys if key not in found))
+        if misses:
+            results = query_collection_batch(collection, [query for query, _ in misses], n_results, embedding_model)
+            formatted = [
+                (format_retrieved_documents(result), max((doc["score"] for doc in result), default=None))
+                for result in results
+            ]
+            with cache_lock:
+                for key, value in zip(misses, formatted):
+                    found[key] = cache[key] = value
+                while len(cache) > RETRIEVAL_CACHE_SIZE:
+                    cache.popitem(last=False)
+        
+        return [found[key] for key in keys]
+    
     def retrieve_documents(query: str) -> str:
         """Retrieve relevant documents for a query.
         
@@ -35,29 +131,15 @@ def create_chroma_retriever_function(
         Returns:
             Formatted string of relevant documents
         """
-        results = search_documents(
-            query=query,
-            n_results=n_results,
-            collection_name=collection_name,
-            host=host,
-            port=port,
-            embedding_model=embedding_model
-        )
-        
-        if not results:
-            return "No relevant documents found."
-        
-        # Format results for RAG
-        formatted_docs = []
-        for i, result in enumerate(results, 1):
-            doc_info = f"Document {i}:\n"
-            doc_info += f"Source: {result['metadata'].get('filename', 'Unknown')}\n"
-            doc_info += f"Type: {result['metadata'].get('document_type', 'Unknown')}\n"
-            doc_info += f"Content: {result['content']}\n"
-            doc_info += f"Relevance Score: {result['score']:.3f}\n"
-            formatted_docs.append(doc_info)
-        
-        return "\n" + "="*50 + "\n".join(formatted_docs)
+        return retrieve_documents_batch([query])[0][0]
+    
+    def clear_cache() -> None:
+        """Drop all cached results."""
+        with cache_lock:
+            cache.clear()
+    
+    retrieve_documents.batch = retrieve_documents_batch
+    retrieve_documents.clear_cache = clear_cache
     
     return retrieve_documents
 
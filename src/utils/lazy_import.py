@@ -0,0 +1,24 @@
+"""Deferred imports for the Streamlit apps."""
+
+import importlib
+from typing import Any
+import streamlit as st
+
+
+def lazy_import(module_name: str, attribute: str) -> Any:
+    """Import a heavy module on first use and keep the resolved attribute in session state.
+
+    LangChain, LangGraph and ChromaDB take seconds to import, so they are loaded
+    behind function boundaries and the page is drawn before they are needed.
+
+    Args:
+        module_name: Module to import
+        attribute: Name of the attribute to fetch from the module
+
+    Returns:
+        The module's attribute
+    """
+    key = f"_lazy_{module_name}.{attribute}"
+    if key not in st.session_state:
+        st.session_state[key] = getattr(importlib.import_module(module_name), attribute)
+    return st.session_state[key]
@@ -0,0 +1,26 @@
+"""Logging setup."""
+
+import logging
+from pathlib import Path
+from config.constants import LOG_LEVEL, LOG_FILE
+
+
+def configure_logging(level: str = LOG_LEVEL, log_file: str = LOG_FILE) -> None:
+    """Send log records to the log file, once per process.
+
+    Streamlit re-runs the app script on every interaction, so the root logger is
+    left untouched once it has handlers.
+
+    Args:
+        level: Minimum level of records to write
+        log_file: Path to the log file
+    """
+    if logging.getLogger().handlers:
+        return
+
+    Path(log_file).parent.mkdir(parents=True, exist_ok=True)
+    logging.basicConfig(
+        level=level,
+        filename=log_file,
+        format="%(asctime)s %(levelname)s [%(processName)s] %(name)s: %(message)s"
+    )
@@ -0,0 +1,37 @@
+"""LangSmith tracing setup."""
+
+import os
+from typing import Optional
+
+# Cached result of the one-time setup; None until configure_langsmith_tracing runs
+_tracing_enabled: Optional[bool] = None
+
+
+def configure_langsmith_tracing() -> bool:
+    """Export LangSmith settings as LangChain tracing variables, once per process.
+
+    Streamlit re-runs the app script on every interaction, so the environment is
+    only written on the first call and later calls return the cached result.
+
+    Returns:
+        Whether LangSmith tracing is enabled
+    """
+    global _tracing_enabled
+    if _tracing_enabled is not None:
+        return _tracing_enabled
+
+    langsmith_tracing = os.getenv("LANGSMITH_TRACING", "false").lower() == "true"
+    langsmith_api_key = os.getenv("LANGSMITH_API_KEY")
+    langsmith_endpoint = os.getenv("LANGSMITH_ENDPOINT")
+    langsmith_project = os.getenv("LANGSMITH_PROJECT")
+
+    if langsmith_tracing and langsmith_api_key:
+        os.environ["LANGCHAIN_TRACING_V2"] = "true"
+        os.environ["LANGCHAIN_API_KEY"] = langsmith_api_key
+        if langsmith_endpoint:
+            os.environ["LANGCHAIN_ENDPOINT"] = langsmith_endpoint
+        if langsmith_project:
+            os.environ["LANGCHAIN_PROJECT"] = langsmith_project
+
+    _tracing_enabled = bool(langsmith_tracing and langsmith_api_key)
+    return _tracing_enabled
@@ -1,18 +1,51 @@
 """Basic functionality tests for the RAG system."""
 
 import pytest
+import io
+import json
 import os
 import tempfile
 from pathlib import Path
 import sys
 
-# Add src to path
+# Add src and the project root (for config) to path
 src_path = Path(__file__).parent.parent / "src"
 sys.path.insert(0, str(src_path))
+sys.path.insert(0, str(src_path.parent))
 
 from document_processing.pdf_processor import extract_text_from_pdf, process_pdf_document
-from document_processing.notebook_processor import extract_text_from_notebook, process_notebook_document
-from document_processing.processor import process_single_document
+from document_processing.notebook_processor import (
+    extract_text_from_notebook,
+    process_notebook_document,
+    process_multiple_notebooks,
+)
+from document_processing import extraction_cache
+from document_processing.extraction_cache import cached_extract, is_unchanged
+from document_processing.file_reader import BufferPool, read_file
+from document_processing.processor import process_documents, process_single_document
+from document_processing.text_splitting import fast_split
+from document_processing.types import ChunkBatch
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage, ToolMessage
+from rag.memory import create_checkpointer, get_memory_connection, load_messages, save_message
+from rag.workflow import (
+    answer_retrieval_calls,
+    cache_response,
+    get_cached_response,
+    route_on_scores,
+    stream_rag_response,
+)
+from retrieval import chroma_client, ingestion
+from retrieval.chroma_client import add_documents_to_chroma, distance_to_similarity
+from retrieval.embedding_cache import embed_documents_cached
+from retrieval.ingestion import ingest_stream
+
+
+@pytest.fixture(autouse=True)
+def extraction_cache_path(tmp_path, monkeypatch):
+    """Give each test an empty extraction cache outside the repository."""
+    cache_path = str(tmp_path / "extraction_cache")
+    monkeypatch.setenv(extraction_cache.EXTRACTION_CACHE_ENV, cache_path)
+    return cache_path
 
 
 def test_pdf_text_extraction():
@@ -44,27 +77,24 @@ def test_notebook_text_extraction():
         ]
     }
     
-    # Write to temporary file
-    with tempfile.NamedTemporaryFile(mode='w', suffix='.ipynb', delete=False) as f:
-        import json
-        json.dump(test_notebook, f)
-        temp_path = f.name
+    # Read from memory streams rather than temporary files
+    result = extract_text_from_notebook(io.StringIO(json.dumps(test_notebook)), include_outputs=True)
+    assert "[MARKDOWN]" in result
+    assert "[CODE]" in result
+    assert "[OUTPUT]" in result
+    assert "Test Notebook" in result
+    assert "Hello, World!" in result
     
-    try:
-        result = extract_text_from_notebook(temp_path)
-        assert "[MARKDOWN]" in result
-        assert "[CODE]" in result
-        assert "[OUTPUT]" in result
-        assert "Test Notebook" in result
-        assert "Hello, World!" in result
-    finally:
-        os.unlink(temp_path)
+    # Outputs are skipped by default
+    result = extract_text_from_notebook(io.StringIO(json.dumps(test_notebook)))
+    assert "[CODE]" in result
+    assert "[OUTPUT]" not in result
 
 
 def test_process_single_document_unsupported():
     """Test processing unsupported file types."""
     result = process_single_document("test.txt")
-    assert result == []
+    assert len(result) == 0
 
 
 def test_document_chunk_structure():
@@ -80,7 +110,6 @@ def test_document_chunk_structure():
     }
     
     with tempfile.NamedTemporaryFile(mode='w', suffix='.ipynb', delete=False) as f:
-        import json
         json.dump(test_notebook, f)
         temp_path = f.name
     
@@ -100,5 +129,372 @@ def test_document_chunk_structure():
         os.unlink(temp_path)
 
 
+def test_fast_split_chunk_bounds():
+    """Test that chunks respect the size limit, break on whitespace and keep every word."""
+    text = "\n\n".join(" ".join(f"word{i}_{j}" for j in range(12)) for i in range(20))
+    
+    chunks = fast_split(text, chunk_size=60, chunk_overlap=15)
+    
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 60 for chunk in chunks)
+    assert set(text.split()) == set(" ".join(chunks).split())
+    assert fast_split("short text", chunk_size=60, chunk_overlap=15) == ["short text"]
+
+
+def test_process_multiple_notebooks_parallel():
+    """Test that notebooks processed across worker processes are all collected."""
+    test_notebook = {
+        "cells": [
+            {
+                "cell_type": "markdown",
+                "source": ["# Test\n", "This is a test document with some content."]
+            }
+        ]
+    }
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for name in ("first.ipynb", "second.ipynb", "third.ipynb"):
+            with open(os.path.join(temp_dir, name), "w") as f:
+                json.dump(test_notebook, f)
+        
+        documents = process_multiple_notebooks(temp_dir, chunk_size=50, chunk_overlap=10, num_workers=2)
+        
+        filenames = {doc["metadata"]["filename"] for doc in documents}
+        assert filenames == {"first.ipynb", "second.ipynb", "third.ipynb"}
+
+
+def test_chunk_batch_deduplicated():
+    """Test that repeated contents are stored once per source and kept chunks are renumbered."""
+    first = ChunkBatch.from_chunks("a.pdf", ["header", "body", "header", "footer"], "pdf")
+    second = ChunkBatch.from_chunks("b.pdf", ["header"], "pdf")
+    batch = ChunkBatch()
+    batch.extend(first)
+    batch.extend(second)
+    
+    unique = batch.deduplicated()
+    
+    assert unique.documents == ["header", "body", "footer", "header"]
+    assert unique.ids == [first.ids[0], first.ids[1], first.ids[3], second.ids[0]]
+    assert [metadata["chunk_id"] for metadata in unique.metadatas] == [0, 1, 2, 0]
+    assert [metadata["total_chunks"] for metadata in unique.metadatas] == [3, 3, 3, 1]
+    assert all("also_in" not in metadata for metadata in unique.metadatas)
+    assert first.metadatas[3]["chunk_id"] == 3
+
+
+def test_chunk_ids_follow_contents():
+    """Test that chunk IDs are stable for a document but change with its contents."""
+    first = ChunkBatch.from_chunks("report.pdf", ["alpha", "beta"], "pdf")
+    
+    assert first.ids == ChunkBatch.from_chunks("report.pdf", ["alpha", "beta"], "pdf").ids
+    assert first.ids[0].endswith("-0") and len(first.ids[0].split("-")[0]) == 32
+    assert first.ids[0] != ChunkBatch.from_chunks("report.pdf", ["alpha", "gamma"], "pdf").ids[0]
+    assert first.ids[0] != ChunkBatch.from_chunks("report.pdf", ["alphabeta"], "pdf").ids[0]
+    assert first.ids[0] != ChunkBatch.from_chunks("other/report.pdf", ["alpha", "beta"], "pdf").ids[0]
+
+
+def test_process_single_document_routes_by_extension():
+    """Test that files are handled by the processor for their extension, whatever its case."""
+    notebook = {"cells": [{"cell_type": "markdown", "source": ["# Routed\n", "Notebook text."]}]}
+    notebook_bytes = json.dumps(notebook).encode()
+    
+    documents = process_single_document("upload.IPYNB", 50, 10, notebook_bytes)
+    assert documents.metadatas[0]["document_type"] == "notebook"
+    assert documents.metadatas[0]["source"] == "upload.IPYNB"
+    
+    # Notebook contents under a PDF name go to the PDF processor, which cannot parse them
+    assert len(process_single_document("upload.pdf", 50, 10, notebook_bytes)) == 0
+    assert len(process_single_document("notes.md", 50, 10, b"# Notes")) == 0
+
+
+def test_embedding_cache_reuses_vectors(tmp_path):
+    """Test that only unseen texts are embedded and cached vectors match fresh ones."""
+    class CountingModel:
+        model = "counting"
+        
+        def __init__(self):
+            self.embedded = []
+        
+        def embed_documents(self, texts):
+            self.embedded.extend(texts)
+            return [[float(len(text)), 0.5] for text in texts]
+    
+    cache_path = str(tmp_path / "embedding_cache")
+    model = CountingModel()
+    
+    first = embed_documents_cached(model, ["alpha", "beta"], cache_path=cache_path)
+    second = embed_documents_cached(model, ["beta", "gamma", "alpha"], cache_path=cache_path)
+    
+    assert model.embedded == ["alpha", "beta", "gamma"]
+    assert first == [[5.0, 0.5], [4.0, 0.5]]
+    assert second == [[4.0, 0.5], [5.0, 0.5], [5.0, 0.5]]
+
+
+def test_buffer_pool_best_fit_and_cap():
+    """Test that the pool hands out the smallest fitting buffer and keeps at most its byte limit."""
+    pool = BufferPool(max_buffers=4, max_bytes=100)
+    for size in (60, 30, 20, 10):
+        pool.release(bytearray(size))
+    
+    # The 20-byte buffer would have taken the pool past 100 bytes
+    assert len(pool.acquire(15)) == 30
+    assert len(pool.acquire(25)) == 60
+    assert len(pool.acquire(50)) == 50
+    pool.clear()
+    assert len(pool.acquire(5)) == 5
+
+
+def test_read_file_into_pool(tmp_path):
+    """Test that pooled reads return the file contents and respect the size limit."""
+    file_path = tmp_path / "data.bin"
+    file_path.write_bytes(b"0123456789")
+    pool = BufferPool()
+    pool.release(bytearray(64))
+    
+    contents = read_file(str(file_path), buffer_pool=pool)
+    assert bytes(contents) == b"0123456789"
+    assert len(contents.obj) == 64
+    assert read_file(str(file_path), max_bytes=5) is None
+    assert read_file(str(tmp_path / "missing.bin")) is None
+
+
+def test_process_documents_skips_unchanged_files(tmp_path):
+    """Test that files processed before are recorded as unchanged and give the same chunks."""
+    notebook = {"cells": [{"cell_type": "markdown", "source": ["# Cached\n", "Some notebook text."]}]}
+    file_path = tmp_path / "cached.ipynb"
+    file_path.write_text(json.dumps(notebook))
+    
+    assert not is_unchanged(str(file_path))
+    first = process_documents([str(file_path)], num_workers=1)
+    assert is_unchanged(str(file_path))
+    assert process_documents([str(file_path)], num_workers=1).documents == first.documents
+
+
+class _FakeCollection:
+    """In-memory stand-in for the ChromaDB collection calls used when writing chunks."""
+    
+    def __init__(self):
+        self.chunks = {}
+    
+    def upsert(self, embeddings, documents, metadatas, ids):
+        for chunk_id, document, metadata in zip(ids, documents, metadatas):
+            self.chunks[chunk_id] = (document, metadata)
+    
+    def get(self, where, include):
+        sources = where["source"]["$in"]
+        return {"ids": [chunk_id for chunk_id, (_, metadata) in self.chunks.items() if metadata["source"] in sources]}
+    
+    def delete(self, ids):
+        for chunk_id in ids:
+            del self.chunks[chunk_id]
+    
+    def texts(self, source):
+        return sorted(document for document, metadata in self.chunks.values() if metadata["source"] == source)
+
+
+class _FakeEmbeddings:
+    """Embedding model that fails on demand."""
+    
+    fail = False
+    
+    def embed_documents(self, texts):
+        if self.fail:
+            raise RuntimeError("embedding service unavailable")
+        return [[1.0, 0.0] for _ in texts]
+
+
+@pytest.fixture
+def fake_collection(monkeypatch):
+    """Write chunks to an in-memory collection and embed them without the disk cache."""
+    collection = _FakeCollection()
+    monkeypatch.setattr(chroma_client, "get_cached_collection", lambda *args: collection)
+    monkeypatch.setattr(ingestion, "get_cached_collection", lambda *args: collection)
+    for module in (chroma_client, ingestion):
+        monkeypatch.setattr(module, "embed_documents_cached", lambda model, texts: model.embed_documents(texts))
+    return collection
+
+
+def test_reingestion_replaces_chunks_only_after_writing(fake_collection):
+    """Test that re-ingesting drops old chunks once the new ones are written, and keeps them on failure."""
+    model = _FakeEmbeddings()
+    old = ChunkBatch.from_chunks("a.pdf", ["one", "two", "three"], "pdf")
+    new = ChunkBatch.from_chunks("a.pdf", ["one", "changed"], "pdf")
+    other = ChunkBatch.from_chunks("b.pdf", ["other"], "pdf")
+    
+    assert add_documents_to_chroma(old, embedding_model=model)
+    ingest_stream([other], embedding_model=model)
+    
+    model.fail = True
+    assert not add_documents_to_chroma(new, embedding_model=model)
+    with pytest.raises(RuntimeError):
+        ingest_stream([new], embedding_model=model)
+    assert fake_collection.texts("a.pdf") == ["one", "three", "two"]
+    
+    model.fail = False
+    ingest_stream([new], embedding_model=model)
+    assert fake_collection.texts("a.pdf") == ["changed", "one"]
+    assert add_documents_to_chroma(old, embedding_model=model)
+    assert fake_collection.texts("a.pdf") == ["one", "three", "two"]
+    assert fake_collection.texts("b.pdf") == ["other"]
+
+
+def _retrieval_turn(*top_scores):
+    """Build a conversation ending with one tool result per retrieval score."""
+    tool_calls = [
+        {"name": "retrieve_documents", "args": {"query": f"q{i}"}, "id": f"call{i}"}
+        for i in range(len(top_scores))
+    ]
+    return [
+        HumanMessage(content="question"),
+        AIMessage(content="", tool_calls=tool_calls),
+        *(
+            ToolMessage(content=f"docs {i}", artifact={"top_score": score}, tool_call_id=f"call{i}")
+            for i, score in enumerate(top_scores)
+        )
+    ]
+
+
+def test_answer_retrieval_calls_reports_errors():
+    """Test that search results become tool messages and a failed search does not raise."""
+    tool_calls = _retrieval_turn(None, None)[1].tool_calls
+    
+    def failing_search(queries):
+        raise ConnectionError("ChromaDB is down")
+    
+    answered = answer_retrieval_calls(lambda queries: [(f"docs for {query}", 0.9) for query in queries], tool_calls)
+    assert [message.content for message in answered] == ["docs for q0", "docs for q1"]
+    assert [message.artifact for message in answered] == [{"top_score": 0.9}] * 2
+    
+    failed = answer_retrieval_calls(failing_search, tool_calls)
+    assert [message.tool_call_id for message in failed] == ["call0", "call1"]
+    assert all(message.status == "error" and "ChromaDB is down" in message.content for message in failed)
+
+
+def test_route_on_scores():
+    """Test that the best score of the turn accepts, rejects or defers to the grader."""
+    assert route_on_scores(_retrieval_turn(0.9)) == "generate_answer"
+    assert route_on_scores(_retrieval_turn(0.1)) == "rewrite_question"
+    assert route_on_scores(_retrieval_turn(None)) == "rewrite_question"
+    assert route_on_scores(_retrieval_turn(0.5)) is None
+    # A good hit is not hidden by a weaker result returned after it
+    assert route_on_scores(_retrieval_turn(0.9, 0.1)) == "generate_answer"
+    assert route_on_scores(_retrieval_turn(None, 0.5)) is None
+    # Tool results without a score are left to the grader
+    assert route_on_scores([HumanMessage(content="question"), ToolMessage(content="docs", tool_call_id="x")]) is None
+
+
+class _FakeGraph:
+    """Graph stand-in that streams the given chunks and ends in the given state."""
+    
+    def __init__(self, chunks, final_message):
+        self.chunks = chunks
+        self.final_message = final_message
+    
+    def stream(self, inputs, config, stream_mode):
+        return iter(self.chunks)
+    
+    def get_state(self, config):
+        class State:
+            values = {"messages": [HumanMessage(content="question"), self.final_message]}
+        return State()
+
+
+def test_stream_rag_response_falls_back_to_final_answer():
+    """Test that answers from models that do not stream are still returned once."""
+    streaming = _FakeGraph(
+        [(AIMessageChunk(content="Hel"), {"langgraph_node": "generate_answer"}),
+         (AIMessageChunk(content="lo"), {"langgraph_node": "generate_answer"}),
+         (AIMessageChunk(content="yes"), {"langgraph_node": "grade_documents"})],
+        AIMessage(content="Hello")
+    )
+    non_streaming = _FakeGraph([], AIMessage(content="Whole answer"))
+    
+    assert "".join(stream_rag_response(streaming, "question")) == "Hello"
+    assert list(stream_rag_response(non_streaming, "question")) == ["Whole answer"]
+    assert list(stream_rag_response(_FakeGraph([], AIMessage(content="")), "question")) == []
+
+
+def test_empty_answers_are_not_cached():
+    """Test that an empty answer is not served from the response cache later."""
+    graph = object()
+    cache_response(graph, "question", "", thread_id="empty")
+    assert get_cached_response(graph, "question", thread_id="empty") is None
+    cache_response(graph, "question", "answer", thread_id="empty")
+    assert get_cached_response(graph, "  Question ", thread_id="empty") == "answer"
+
+
+def test_distance_to_similarity():
+    """Test that L2 and cosine distances of unit vectors map to the same cosine similarity."""
+    cosine = 0.6
+    assert distance_to_similarity(2 - 2 * cosine, "l2") == pytest.approx(cosine)
+    assert distance_to_similarity(1 - cosine, "cosine") == pytest.approx(cosine)
+
+
+def test_ingest_stream_requires_embed_worker():
+    """Test that a pipeline without embedding workers is rejected instead of hanging."""
+    with pytest.raises(ValueError):
+        ingest_stream([], embed_workers=0, embedding_model=object())
+
+
+def test_cached_extract_hit_and_miss(tmp_path):
+    """Test that identical contents reuse the extracted text and changed contents are extracted again."""
+    file_path = tmp_path / "doc.txt"
+    file_path.write_bytes(b"first version")
+    calls = []
+    
+    def extract():
+        calls.append(file_path.read_bytes())
+        return file_path.read_text()
+    
+    assert cached_extract(str(file_path), None, "test", extract) == "first version"
+    assert cached_extract(str(file_path), None, "test", extract) == "first version"
+    assert cached_extract("upload.txt", b"first version", "test", extract) == "first version"
+    assert len(calls) == 1
+    
+    # Same size, different contents and modification time
+    file_path.write_bytes(b"other version")
+    os.utime(file_path, ns=(0, 0))
+    assert cached_extract(str(file_path), None, "test", extract) == "other version"
+    # Other extractor options do not share entries
+    assert cached_extract(str(file_path), None, "test:other", extract) == "other version"
+    assert len(calls) == 3
+
+
+def test_cached_extract_invalidation(tmp_path, monkeypatch):
+    """Test that a new cache version and empty results are extracted again."""
+    file_path = tmp_path / "doc.txt"
+    file_path.write_bytes(b"contents")
+    calls = []
+    
+    def extract():
+        calls.append(None)
+        return "text"
+    
+    cached_extract(str(file_path), None, "test", extract)
+    monkeypatch.setattr(extraction_cache, "EXTRACTION_CACHE_VERSION", extraction_cache.EXTRACTION_CACHE_VERSION + 1)
+    cached_extract(str(file_path), None, "test", extract)
+    assert len(calls) == 2
+    
+    # Failed extractions are not remembered
+    assert cached_extract("empty.txt", b"no text", "test", lambda: "") == ""
+    assert cached_extract("empty.txt", b"no text", "test", extract) == "text"
+
+
+def test_memory_round_trip_beside_checkpointer(tmp_path):
+    """Test that transcripts are stored in order next to a checkpointer with its own connection."""
+    db_path = str(tmp_path / "memory.sqlite")
+    checkpointer = create_checkpointer(db_path)
+    
+    save_message("session", "user", "question", db_path)
+    save_message("other", "user", "elsewhere", db_path)
+    save_message("session", "assistant", "answer", db_path)
+    
+    assert checkpointer.conn is not get_memory_connection(db_path)
+    assert load_messages("session", db_path) == [
+        {"role": "user", "content": "question"},
+        {"role": "assistant", "content": "answer"}
+    ]
+    assert load_messages("missing", db_path) == []
+
+
 if __name__ == "__main__":
     pytest.main([__file__])